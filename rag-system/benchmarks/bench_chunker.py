@@ -0,0 +1,80 @@
+# benchmarks/bench_chunker.py
+# Compare the native chunker against LangChain's RecursiveCharacterTextSplitter
+
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_core.documents import Document
+from ingestion.chunker import RecursiveChunker
+from ingestion.ingest import iter_pdf_pages, list_pdf_files
+import argparse
+import logging
+import random
+import time
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def synthetic_pages(count: int, seed: int = 0):
+    '''Generate page Documents of prose-like text with paragraphs and line breaks.'''
+    rng = random.Random(seed)
+    words = ['retrieval', 'vector', 'index', 'the', 'of', 'a', 'document', 'chunk', 'embedding', 'query', 'model', 'page']
+    pages = []
+    for page in range(count):
+        paragraphs = []
+        for _ in range(rng.randint(3, 8)):
+            lines = [' '.join(rng.choice(words) for _ in range(rng.randint(5, 15))) for _ in range(rng.randint(2, 10))]
+            paragraphs.append('\n'.join(lines))
+        pages.append(Document(page_content='\n\n'.join(paragraphs), metadata={'source': 'synthetic.pdf', 'page': page}))
+    return pages
+
+
+def best_of(fn, repeat: int):
+    '''Return (best wall time in seconds, last result) over repeat runs of fn.'''
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def run(pages, chunk_size: int, chunk_overlap: int, repeat: int):
+    '''Time both chunkers on pages and check that they produce the same chunks.'''
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    chunker = RecursiveChunker(chunk_size, chunk_overlap)
+
+    langchain_seconds, documents = best_of(lambda: text_splitter.split_documents(pages), repeat)
+    native_seconds, chunks = best_of(
+        lambda: [c for p in pages for c in chunker.chunk_page(p.page_content, p.metadata['source'], p.metadata['page'])],
+        repeat,
+    )
+
+    identical = [d.page_content for d in documents] == [c.text for c in chunks] and \
+        [d.metadata['page'] for d in documents] == [c.page for c in chunks]
+    characters = sum(len(p.page_content) for p in pages)
+    return {
+        'pages': len(pages),
+        'chunks': len(chunks),
+        'identical': identical,
+        'langchain_seconds': round(langchain_seconds, 4),
+        'native_seconds': round(native_seconds, 4),
+        'speedup': round(langchain_seconds / native_seconds, 2) if native_seconds > 0 else None,
+        'native_mb_per_second': round(characters / native_seconds / 1e6, 2) if native_seconds > 0 else None,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the native chunker against LangChain')
+    parser.add_argument('--directory', type=str, default=None, help='Directory of PDFs to chunk (default: synthetic pages)')
+    parser.add_argument('--pages', type=int, default=2000, help='Number of synthetic pages')
+    parser.add_argument('--chunk-size', type=int, default=500, help='Size of text chunks')
+    parser.add_argument('--chunk-overlap', type=int, default=100, help='Overlap between chunks')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per chunker; the best time is reported')
+    args = parser.parse_args()
+
+    if args.directory:
+        pages = [page for path in list_pdf_files(args.directory) for page in iter_pdf_pages(path)]
+    else:
+        pages = synthetic_pages(args.pages)
+    logger.info(f'Chunker benchmark: {run(pages, args.chunk_size, args.chunk_overlap, args.repeat)}')
@@ -0,0 +1,85 @@
+# benchmarks/bench_vector_store.py
+# Compare query latency of the NumPy vector store against embedded Qdrant on random vectors
+
+from qdrant_client import QdrantClient
+from qdrant_client.models import Distance, VectorParams
+from utils.numpy_store import NumpyVectorStore
+import argparse
+import logging
+import tempfile
+import time
+import uuid
+import numpy as np
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+COLLECTION = 'bench'
+
+
+def random_vectors(count: int, dimension: int, seed: int = 0):
+    '''Return count random unit vectors as a float32 array.'''
+    vectors = np.random.default_rng(seed).normal(size=(count, dimension)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def bench_store(client, vectors, queries, top_k: int, batch_size: int = 1024):
+    '''Load vectors into client and time each query; returns load seconds, per-query latencies and top-k ids.'''
+    ids = [str(uuid.UUID(int=i)) for i in range(len(vectors))]
+    client.create_collection(COLLECTION, vectors_config=VectorParams(size=vectors.shape[1], distance=Distance.COSINE))
+    start = time.perf_counter()
+    for offset in range(0, len(vectors), batch_size):
+        client.upload_collection(
+            collection_name=COLLECTION, vectors=vectors[offset:offset + batch_size],
+            payload=[{'source': f'doc{i % 100}'} for i in range(offset, min(offset + batch_size, len(vectors)))],
+            ids=ids[offset:offset + batch_size], batch_size=batch_size, wait=True,
+        )
+    load_seconds = time.perf_counter() - start
+    latencies, results = [], []
+    for query in queries:
+        start = time.perf_counter()
+        points = client.query_points(collection_name=COLLECTION, query=query, limit=top_k).points
+        latencies.append(time.perf_counter() - start)
+        results.append([point.id for point in points])
+    return load_seconds, np.array(latencies), results
+
+
+def summarize(load_seconds, latencies, points: int):
+    return {
+        'load_points_per_second': round(points / load_seconds, 1),
+        'query_p50_ms': round(float(np.percentile(latencies, 50)) * 1000, 3),
+        'query_p95_ms': round(float(np.percentile(latencies, 95)) * 1000, 3),
+    }
+
+
+def run(points: int = 100000, dimension: int = 384, queries: int = 50, top_k: int = 5):
+    '''Benchmark both stores on the same random data and report latency and top-k agreement.'''
+    vectors = random_vectors(points, dimension)
+    query_vectors = random_vectors(queries, dimension, seed=1)
+    report = {'points': points, 'dimension': dimension, 'queries': queries}
+    with tempfile.TemporaryDirectory() as qdrant_dir, tempfile.TemporaryDirectory() as numpy_dir:
+        qdrant = QdrantClient(path=qdrant_dir)
+        qdrant_load, qdrant_latencies, qdrant_results = bench_store(qdrant, vectors, query_vectors, top_k)
+        qdrant.close()
+        store = NumpyVectorStore(numpy_dir)
+        numpy_load, numpy_latencies, numpy_results = bench_store(store, vectors, query_vectors, top_k)
+        store.close()
+    report['qdrant_embedded'] = summarize(qdrant_load, qdrant_latencies, points)
+    report['numpy'] = summarize(numpy_load, numpy_latencies, points)
+    report['query_speedup'] = round(float(np.median(qdrant_latencies) / np.median(numpy_latencies)), 1)
+    report[f'top{top_k}_agreement'] = round(float(np.mean([
+        len(set(a) & set(b)) / top_k for a, b in zip(qdrant_results, numpy_results)
+    ])), 4)
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the NumPy vector store against embedded Qdrant')
+    parser.add_argument('--points', type=int, default=100000, help='Number of stored vectors')
+    parser.add_argument('--dimension', type=int, default=384, help='Vector dimension')
+    parser.add_argument('--queries', type=int, default=50, help='Number of timed queries')
+    parser.add_argument('--top-k', type=int, default=5, help='Results per query')
+    args = parser.parse_args()
+
+    logger.info(f'Vector store benchmark: {run(args.points, args.dimension, args.queries, args.top_k)}')
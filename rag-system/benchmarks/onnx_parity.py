@@ -0,0 +1,77 @@
+# benchmarks/onnx_parity.py
+# Check that the ONNX embedding backends agree with the torch backend and compare their speed
+
+from benchmarks.bench_chunker import synthetic_pages
+from ingestion.chunker import RecursiveChunker
+from ingestion.ingest import iter_pdf_pages, list_pdf_files
+from utils.embeddings import load_model
+import argparse
+import logging
+import time
+import numpy as np
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def sample_texts(directory: str = None, limit: int = 512, chunk_size: int = 500, chunk_overlap: int = 100):
+    '''Return up to limit chunk texts from the PDFs in directory, or from synthetic pages.'''
+    chunker = RecursiveChunker(chunk_size, chunk_overlap)
+    pages = (
+        (page.page_content for path in list_pdf_files(directory) for page in iter_pdf_pages(path))
+        if directory else (page.page_content for page in synthetic_pages(limit))
+    )
+    texts = []
+    for text in pages:
+        texts.extend(chunker.split_text(text))
+        if len(texts) >= limit:
+            break
+    return texts[:limit]
+
+
+def timed_encode(model, texts, batch_size: int):
+    start = time.perf_counter()
+    embeddings = np.asarray(model.encode(texts, batch_size=batch_size), dtype=np.float32)
+    return embeddings, time.perf_counter() - start
+
+
+def cosine_rows(a, b):
+    '''Cosine similarity between corresponding rows of a and b.'''
+    return (a * b).sum(axis=1) / (np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1))
+
+
+def run(texts, backends=('onnx', 'onnx-int8'), batch_size: int = 64):
+    '''Encode texts with torch and each backend, reporting cosine agreement and throughput.'''
+    reference_model = load_model('torch')
+    timed_encode(reference_model, texts[:batch_size], batch_size)  # Warm up
+    reference, reference_seconds = timed_encode(reference_model, texts, batch_size)
+    report = {'texts': len(texts), 'torch': {'texts_per_second': round(len(texts) / reference_seconds, 1)}}
+    for backend in backends:
+        model = load_model(backend)
+        timed_encode(model, texts[:batch_size], batch_size)
+        embeddings, seconds = timed_encode(model, texts, batch_size)
+        cosines = cosine_rows(reference, embeddings)
+        report[backend] = {
+            'texts_per_second': round(len(texts) / seconds, 1),
+            'speedup': round(reference_seconds / seconds, 2),
+            'cosine_mean': round(float(cosines.mean()), 6),
+            'cosine_min': round(float(cosines.min()), 6),
+        }
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare ONNX embedding backends with torch')
+    parser.add_argument('--directory', type=str, default=None, help='Directory of PDFs to sample chunks from (default: synthetic text)')
+    parser.add_argument('--limit', type=int, default=512, help='Number of chunks to embed')
+    parser.add_argument('--batch-size', type=int, default=64, help='Texts per forward pass')
+    parser.add_argument('--backends', nargs='+', default=['onnx', 'onnx-int8'], help='Backends to compare with torch')
+    parser.add_argument('--min-cosine', type=float, default=0.99, help='Fail if any backend has a lower minimum cosine')
+    args = parser.parse_args()
+
+    report = run(sample_texts(args.directory, args.limit), args.backends, args.batch_size)
+    logger.info(f'ONNX parity: {report}')
+    failed = [backend for backend in args.backends if report[backend]['cosine_min'] < args.min_cosine]
+    if failed:
+        raise SystemExit(f'Cosine agreement below {args.min_cosine} for: {", ".join(failed)}')
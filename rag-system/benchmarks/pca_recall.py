@@ -0,0 +1,67 @@
+# benchmarks/pca_recall.py
+# Measure the recall@k lost by searching PCA-reduced vectors instead of full-dimension ones
+
+from benchmarks.onnx_parity import sample_texts
+from utils.embeddings import embed_array
+from utils.projection import PCAProjection
+import argparse
+import logging
+import numpy as np
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def top_k(corpus, queries, k: int):
+    '''Return the indices of the k corpus rows most cosine-similar to each query (exact search).'''
+    corpus = corpus / np.linalg.norm(corpus, axis=1, keepdims=True)
+    queries = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+    scores = queries @ corpus.T
+    k = min(k, corpus.shape[0])
+    candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.take_along_axis(scores, candidates, axis=1).argsort(axis=1)[:, ::-1]
+    return np.take_along_axis(candidates, order, axis=1)
+
+
+def recall_at_k(reference, candidates):
+    '''Mean share of each reference top-k list found in the corresponding candidate list.'''
+    return float(np.mean([len(set(r) & set(c)) / len(r) for r, c in zip(reference, candidates)]))
+
+
+def run(texts, dimensions, k: int = 10, queries: int = 100, sample_size: int = 4096):
+    '''
+    Embed texts, hold out queries of them, and compare top-k results with full and PCA-reduced vectors.
+
+    The projection is fitted on up to sample_size corpus embeddings, as ingestion does.
+    '''
+    embeddings = embed_array(texts)
+    query_vectors, corpus = embeddings[:queries], embeddings[queries:]
+    reference = top_k(corpus, query_vectors, k)
+    report = {'corpus': len(corpus), 'queries': len(query_vectors), 'k': k, 'full_dimension': corpus.shape[1]}
+    for dimension in dimensions:
+        projection = PCAProjection.fit(corpus[:sample_size], dimension)
+        reduced = top_k(projection.transform(corpus), projection.transform(query_vectors), k)
+        report[dimension] = {
+            f'recall@{k}': round(recall_at_k(reference, reduced), 4),
+            'explained_variance': round(projection.explained_variance_ratio, 4),
+            'size_ratio': round(dimension / corpus.shape[1], 3),
+        }
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Report recall@k of PCA-reduced vectors against the full-dimension index')
+    parser.add_argument('--directory', type=str, default=None, help='Directory of PDFs to sample chunks from (default: synthetic text)')
+    parser.add_argument('--limit', type=int, default=2000, help='Number of chunks to embed, including queries')
+    parser.add_argument('--queries', type=int, default=100, help='Number of held-out chunks used as queries')
+    parser.add_argument('--top-k', type=int, default=10, help='k of recall@k')
+    parser.add_argument('--dimensions', type=int, nargs='+', default=[64, 128, 192, 256], help='PCA dimensions to evaluate')
+    parser.add_argument('--sample-size', type=int, default=4096, help='Embeddings used to fit each projection')
+    args = parser.parse_args()
+
+    texts = sample_texts(args.directory, args.limit)
+    if len(texts) <= args.queries:
+        raise SystemExit(f'Need more than {args.queries} chunks, got {len(texts)}')
+    report = run(texts, args.dimensions, args.top_k, args.queries, args.sample_size)
+    logger.info(f'PCA recall: {report}')
@@ -13,10 +13,91 @@ logger = logging.getLogger(__name__)
 # Load environment variables from .env
 load_dotenv()
 
+# Vector store backend: 'qdrant' (embedded or server) or 'numpy' (in-process memory-mapped matrix at NUMPY_STORE_PATH)
+VECTOR_BACKEND = os.getenv('VECTOR_BACKEND', 'qdrant')
+
 # Qdrant settings
+# Qdrant server URL (e.g. http://qdrant:6333); when empty the embedded store at QDRANT_PATH is used,
+# and QDRANT_PATH=':memory:' keeps it in memory (useful for tests)
+QDRANT_URL = os.getenv('QDRANT_URL', '')
+QDRANT_API_KEY = os.getenv('QDRANT_API_KEY', '') or None
+QDRANT_PREFER_GRPC = os.getenv('QDRANT_PREFER_GRPC', 'false').lower() in ('1', 'true', 'yes')
+QDRANT_GRPC_PORT = int(os.getenv('QDRANT_GRPC_PORT', '6334'))
+# Request timeout in seconds for the Qdrant server
+QDRANT_TIMEOUT = int(os.getenv('QDRANT_TIMEOUT', '10'))
 QDRANT_PATH = os.getenv('QDRANT_PATH', '/app/qdrant_data')
 QDRANT_COLLECTION = os.getenv('QDRANT_COLLECTION', 'rag_pdfs')
 VECTOR_DIMENSION = int(os.getenv('VECTOR_DIMENSION', '384'))
+# Vector quantization applied when the collection is created: 'none', 'scalar' (int8) or 'binary'
+QDRANT_QUANTIZATION = os.getenv('QDRANT_QUANTIZATION', 'none')
+# Keep quantized vectors in RAM; with QDRANT_VECTORS_ON_DISK the original vectors are only read for rescoring
+QDRANT_QUANTIZATION_ALWAYS_RAM = os.getenv('QDRANT_QUANTIZATION_ALWAYS_RAM', 'true').lower() in ('1', 'true', 'yes')
+QDRANT_VECTORS_ON_DISK = os.getenv('QDRANT_VECTORS_ON_DISK', 'false').lower() in ('1', 'true', 'yes')
+# Quantile of values used to set the int8 range in scalar quantization
+QDRANT_SCALAR_QUANTILE = float(os.getenv('QDRANT_SCALAR_QUANTILE', '0.99'))
+# Search over quantized vectors: fetch limit * oversampling candidates and rescore them with the original vectors
+QDRANT_SEARCH_RESCORE = os.getenv('QDRANT_SEARCH_RESCORE', 'true').lower() in ('1', 'true', 'yes')
+QDRANT_SEARCH_OVERSAMPLING = float(os.getenv('QDRANT_SEARCH_OVERSAMPLING', '2.0'))
+# HNSW graph of new collections: edges per node, candidate list size while building, and the segment size
+# (in KB of vectors) above which segments are indexed at all
+HNSW_M = int(os.getenv('HNSW_M', '16'))
+HNSW_EF_CONSTRUCT = int(os.getenv('HNSW_EF_CONSTRUCT', '100'))
+QDRANT_INDEXING_THRESHOLD = int(os.getenv('QDRANT_INDEXING_THRESHOLD', '20000'))
+# Default search-time candidate list size; 0 leaves it to Qdrant
+HNSW_EF = int(os.getenv('HNSW_EF', '0'))
+
+# Local state kept next to the index (ingestion manifest, sidecar files)
+STATE_DIR = os.getenv('STATE_DIR', '/app/rag_state')
+INGEST_MANIFEST_PATH = os.getenv('INGEST_MANIFEST_PATH', str(Path(STATE_DIR) / f'{QDRANT_COLLECTION}.manifest.json'))
+# Skip files whose content is unchanged since they were last ingested
+INGEST_INCREMENTAL = os.getenv('INGEST_INCREMENTAL', 'true').lower() in ('1', 'true', 'yes')
+# Minimum seconds between manifest saves during a run; the manifest is always saved when the run ends
+INGEST_MANIFEST_SAVE_INTERVAL = float(os.getenv('INGEST_MANIFEST_SAVE_INTERVAL', '30'))
+# Keep chunk texts in a compressed side store at TEXT_STORE_PATH instead of the vector payloads; blocks of
+# TEXT_STORE_BLOCK_SIZE bytes are compressed with TEXT_STORE_CODEC ('auto' picks zstd when installed, else zlib)
+TEXT_STORE = os.getenv('TEXT_STORE', 'false').lower() in ('1', 'true', 'yes')
+TEXT_STORE_PATH = os.getenv('TEXT_STORE_PATH', str(Path(STATE_DIR) / f'{QDRANT_COLLECTION}.text'))
+TEXT_STORE_BLOCK_SIZE = int(os.getenv('TEXT_STORE_BLOCK_SIZE', '65536'))
+TEXT_STORE_CODEC = os.getenv('TEXT_STORE_CODEC', 'auto')
+# Store a centroid per source PDF at ingest, and by default route queries to the ROUTING_NPROBE sources with the
+# most similar centroids (0 searches every chunk)
+ROUTING_CENTROIDS = os.getenv('ROUTING_CENTROIDS', 'false').lower() in ('1', 'true', 'yes')
+ROUTING_NPROBE = int(os.getenv('ROUTING_NPROBE', '0'))
+# Directory of the NumPy vector store (VECTOR_BACKEND=numpy), one subdirectory per collection
+NUMPY_STORE_PATH = os.getenv('NUMPY_STORE_PATH', str(Path(STATE_DIR) / 'numpy_store'))
+# Optional PCA reduction of stored and query vectors to PCA_DIM dimensions (0 disables it); the projection is fitted
+# on the first PCA_SAMPLE_SIZE embeddings of the first ingestion and saved to PCA_PATH
+PCA_DIM = int(os.getenv('PCA_DIM', '0'))
+PCA_PATH = os.getenv('PCA_PATH', str(Path(STATE_DIR) / f'{QDRANT_COLLECTION}.pca.npz'))
+PCA_SAMPLE_SIZE = int(os.getenv('PCA_SAMPLE_SIZE', '4096'))
+# Fewest embeddings (and never fewer than PCA_DIM) the projection is fitted on; smaller runs are not stored yet
+PCA_MIN_SAMPLES = int(os.getenv('PCA_MIN_SAMPLES', '1024'))
+# Chunking implementation: 'native' (offset-based, default) or 'langchain'
+CHUNKER = os.getenv('CHUNKER', 'native')
+# Unit of chunk_size/chunk_overlap: 'chars' or 'tokens' (embedding model tokenizer)
+CHUNK_UNIT = os.getenv('CHUNK_UNIT', 'chars')
+# In 'chars' mode, count the chunks the embedding model will truncate (tokenizes every chunk a second time)
+INGEST_REPORT_TRUNCATION = os.getenv('INGEST_REPORT_TRUNCATION', 'false').lower() in ('1', 'true', 'yes')
+# Maximum number of embedded points held in memory before they are upserted
+INGEST_WINDOW = int(os.getenv('INGEST_WINDOW', '1024'))
+# Number of processes used to parse and chunk PDFs
+INGEST_WORKERS = int(os.getenv('INGEST_WORKERS', '1'))
+# Maximum number of batches waiting between the parse, embed and upsert stages
+INGEST_QUEUE_SIZE = int(os.getenv('INGEST_QUEUE_SIZE', '4'))
+# Points per upsert request, concurrent upsert requests (Qdrant server only) and retries of a failed request,
+# waiting UPSERT_RETRY_BACKOFF seconds before the first retry and twice as long before each further one
+UPSERT_BATCH_SIZE = int(os.getenv('UPSERT_BATCH_SIZE', '256'))
+UPSERT_WORKERS = int(os.getenv('UPSERT_WORKERS', '4'))
+UPSERT_RETRIES = int(os.getenv('UPSERT_RETRIES', '3'))
+UPSERT_RETRY_BACKOFF = float(os.getenv('UPSERT_RETRY_BACKOFF', '0.5'))
+# Ingest-time deduplication of exact and near-duplicate chunks (MinHash/LSH)
+INGEST_DEDUP = os.getenv('INGEST_DEDUP', 'false').lower() in ('1', 'true', 'yes')
+DEDUP_THRESHOLD = float(os.getenv('DEDUP_THRESHOLD', '0.9'))
+DEDUP_NUM_PERM = int(os.getenv('DEDUP_NUM_PERM', '64'))
+DEDUP_BANDS = int(os.getenv('DEDUP_BANDS', '16'))
+# Watch mode: seconds between directory polls and upsert window used for deltas
+INGEST_WATCH_INTERVAL = float(os.getenv('INGEST_WATCH_INTERVAL', '2'))
+INGEST_WATCH_WINDOW = int(os.getenv('INGEST_WATCH_WINDOW', '64'))
 
 # Allowed directories for ingestion (converted from comma-separated string)
 ALLOWED_DIRECTORIES = set(
@@ -29,16 +110,102 @@ OLLAMA_MODEL = os.getenv('OLLAMA_MODEL', 'mistral')
 
 # Embedding model settings
 EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', 'all-MiniLM-L6-v2')
+EMBEDDING_BATCH_SIZE = int(os.getenv('EMBEDDING_BATCH_SIZE', '64'))
+# Inference backend: 'torch', 'onnx' or 'onnx-int8' (dynamic int8 quantization)
+EMBEDDING_BACKEND = os.getenv('EMBEDDING_BACKEND', 'torch')
+ONNX_EXPORT_DIR = os.getenv('ONNX_EXPORT_DIR', str(Path(STATE_DIR) / 'onnx' / EMBEDDING_MODEL.replace('/', '_')))
+ONNX_THREADS = int(os.getenv('ONNX_THREADS', '0'))
+# Persistent embedding cache (SQLite file); leave empty to disable
+EMBEDDING_CACHE_PATH = os.getenv('EMBEDDING_CACHE_PATH', '')
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv('EMBEDDING_CACHE_MAX_ENTRIES', '1000000'))
+# Coalesce concurrent single-text embed_text calls into one forward pass
+EMBEDDING_MICROBATCH = os.getenv('EMBEDDING_MICROBATCH', 'false').lower() in ('1', 'true', 'yes')
+EMBEDDING_MICROBATCH_WAIT_MS = float(os.getenv('EMBEDDING_MICROBATCH_WAIT_MS', '5'))
+EMBEDDING_MICROBATCH_MAX_SIZE = int(os.getenv('EMBEDDING_MICROBATCH_MAX_SIZE', '32'))
+# Multi-process embedding pool used by ingestion runs of at least EMBEDDING_POOL_MIN_BYTES of PDFs; 0 workers disables it
+EMBEDDING_POOL_WORKERS = int(os.getenv('EMBEDDING_POOL_WORKERS', '0'))
+# Intra-op threads per pool worker; 0 divides the CPU cores evenly between workers
+EMBEDDING_POOL_THREADS = int(os.getenv('EMBEDDING_POOL_THREADS', '0'))
+EMBEDDING_POOL_MIN_BYTES = int(os.getenv('EMBEDDING_POOL_MIN_BYTES', str(50 * 1024 * 1024)))
+# In-memory LRU of query embeddings used by retrieval; 0 entries disables it, 0 TTL keeps entries until evicted
+QUERY_CACHE_SIZE = int(os.getenv('QUERY_CACHE_SIZE', '1024'))
+QUERY_CACHE_TTL = float(os.getenv('QUERY_CACHE_TTL', '0'))
 
 def validate_config():
     '''Validate configuration settings.'''
     try:
-        if not QDRANT_PATH:
-            raise ValueError('QDRANT_PATH is not set')
+        if VECTOR_BACKEND not in ('qdrant', 'numpy'):
+            raise ValueError('VECTOR_BACKEND must be qdrant or numpy')
+        if VECTOR_BACKEND == 'numpy' and not NUMPY_STORE_PATH:
+            raise ValueError('NUMPY_STORE_PATH is not set')
+        if not QDRANT_URL and not QDRANT_PATH:
+            raise ValueError('QDRANT_URL or QDRANT_PATH must be set')
+        if QDRANT_TIMEOUT <= 0:
+            raise ValueError('QDRANT_TIMEOUT must be positive')
         if not QDRANT_COLLECTION:
             raise ValueError('QDRANT_COLLECTION is not set')
         if VECTOR_DIMENSION <= 0:
             raise ValueError('VECTOR_DIMENSION must be positive')
+        if QDRANT_QUANTIZATION not in ('none', 'scalar', 'binary'):
+            raise ValueError('QDRANT_QUANTIZATION must be none, scalar or binary')
+        if not 0.5 <= QDRANT_SCALAR_QUANTILE <= 1:
+            raise ValueError('QDRANT_SCALAR_QUANTILE must be in [0.5, 1]')
+        if QDRANT_SEARCH_OVERSAMPLING < 1:
+            raise ValueError('QDRANT_SEARCH_OVERSAMPLING must be at least 1')
+        if HNSW_M <= 0 or HNSW_EF_CONSTRUCT <= 0:
+            raise ValueError('HNSW_M and HNSW_EF_CONSTRUCT must be positive')
+        if QDRANT_INDEXING_THRESHOLD < 0:
+            raise ValueError('QDRANT_INDEXING_THRESHOLD must not be negative')
+        if HNSW_EF < 0:
+            raise ValueError('HNSW_EF must not be negative')
+        if not INGEST_MANIFEST_PATH:
+            raise ValueError('INGEST_MANIFEST_PATH is not set')
+        if INGEST_MANIFEST_SAVE_INTERVAL < 0:
+            raise ValueError('INGEST_MANIFEST_SAVE_INTERVAL must not be negative')
+        if not 0 <= PCA_DIM <= VECTOR_DIMENSION:
+            raise ValueError('PCA_DIM must be between 0 and VECTOR_DIMENSION')
+        if PCA_DIM and not PCA_PATH:
+            raise ValueError('PCA_PATH is not set')
+        if TEXT_STORE and not TEXT_STORE_PATH:
+            raise ValueError('TEXT_STORE_PATH is not set')
+        if TEXT_STORE_BLOCK_SIZE <= 0:
+            raise ValueError('TEXT_STORE_BLOCK_SIZE must be positive')
+        if TEXT_STORE_CODEC not in ('auto', 'zstd', 'zlib'):
+            raise ValueError('TEXT_STORE_CODEC must be auto, zstd or zlib')
+        if ROUTING_NPROBE < 0:
+            raise ValueError('ROUTING_NPROBE must not be negative')
+        if ROUTING_NPROBE and not ROUTING_CENTROIDS:
+            raise ValueError('ROUTING_NPROBE requires ROUTING_CENTROIDS')
+        if PCA_SAMPLE_SIZE <= 0:
+            raise ValueError('PCA_SAMPLE_SIZE must be positive')
+        if not 0 < PCA_MIN_SAMPLES <= PCA_SAMPLE_SIZE:
+            raise ValueError('PCA_MIN_SAMPLES must be between 1 and PCA_SAMPLE_SIZE')
+        if CHUNKER not in ('native', 'langchain'):
+            raise ValueError('CHUNKER must be native or langchain')
+        if CHUNK_UNIT not in ('chars', 'tokens'):
+            raise ValueError('CHUNK_UNIT must be chars or tokens')
+        if INGEST_WINDOW <= 0:
+            raise ValueError('INGEST_WINDOW must be positive')
+        if INGEST_WORKERS <= 0:
+            raise ValueError('INGEST_WORKERS must be positive')
+        if INGEST_QUEUE_SIZE <= 0:
+            raise ValueError('INGEST_QUEUE_SIZE must be positive')
+        if UPSERT_BATCH_SIZE <= 0:
+            raise ValueError('UPSERT_BATCH_SIZE must be positive')
+        if UPSERT_WORKERS <= 0:
+            raise ValueError('UPSERT_WORKERS must be positive')
+        if UPSERT_RETRIES < 0:
+            raise ValueError('UPSERT_RETRIES must not be negative')
+        if UPSERT_RETRY_BACKOFF < 0:
+            raise ValueError('UPSERT_RETRY_BACKOFF must not be negative')
+        if not 0 < DEDUP_THRESHOLD <= 1:
+            raise ValueError('DEDUP_THRESHOLD must be in (0, 1]')
+        if DEDUP_NUM_PERM <= 0 or DEDUP_BANDS <= 0 or DEDUP_NUM_PERM % DEDUP_BANDS:
+            raise ValueError('DEDUP_BANDS must be a positive divisor of DEDUP_NUM_PERM')
+        if INGEST_WATCH_INTERVAL <= 0:
+            raise ValueError('INGEST_WATCH_INTERVAL must be positive')
+        if INGEST_WATCH_WINDOW <= 0:
+            raise ValueError('INGEST_WATCH_WINDOW must be positive')
         if not ALLOWED_DIRECTORIES:
             raise ValueError('ALLOWED_DIRECTORIES is empty')
         if not OLLAMA_URL:
@@ -47,6 +214,28 @@ def validate_config():
             raise ValueError('OLLAMA_MODEL is not set')
         if not EMBEDDING_MODEL:
             raise ValueError('EMBEDDING_MODEL is not set')
+        if EMBEDDING_BACKEND not in ('torch', 'onnx', 'onnx-int8'):
+            raise ValueError('EMBEDDING_BACKEND must be torch, onnx or onnx-int8')
+        if ONNX_THREADS < 0:
+            raise ValueError('ONNX_THREADS must not be negative')
+        if EMBEDDING_BATCH_SIZE <= 0:
+            raise ValueError('EMBEDDING_BATCH_SIZE must be positive')
+        if EMBEDDING_CACHE_MAX_ENTRIES <= 0:
+            raise ValueError('EMBEDDING_CACHE_MAX_ENTRIES must be positive')
+        if EMBEDDING_MICROBATCH_WAIT_MS < 0:
+            raise ValueError('EMBEDDING_MICROBATCH_WAIT_MS must not be negative')
+        if EMBEDDING_MICROBATCH_MAX_SIZE <= 0:
+            raise ValueError('EMBEDDING_MICROBATCH_MAX_SIZE must be positive')
+        if EMBEDDING_POOL_WORKERS < 0:
+            raise ValueError('EMBEDDING_POOL_WORKERS must not be negative')
+        if EMBEDDING_POOL_THREADS < 0:
+            raise ValueError('EMBEDDING_POOL_THREADS must not be negative')
+        if EMBEDDING_POOL_MIN_BYTES < 0:
+            raise ValueError('EMBEDDING_POOL_MIN_BYTES must not be negative')
+        if QUERY_CACHE_SIZE < 0:
+            raise ValueError('QUERY_CACHE_SIZE must not be negative')
+        if QUERY_CACHE_TTL < 0:
+            raise ValueError('QUERY_CACHE_TTL must not be negative')
         logger.info('Configuration validated successfully')
     except Exception as e:
         logger.error(f'Configuration validation failed: {str(e)}')
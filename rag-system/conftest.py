@@ -0,0 +1,7 @@
+# conftest.py
+# Makes pytest import the tests' modules (config, ingestion, utils, ...) from rag-system, wherever it is run from
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
@@ -0,0 +1,173 @@
+# ingestion/chunker.py
+# Native recursive character chunker producing lightweight, offset-based chunk records
+
+import logging
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Same separators, in the same order, as LangChain's RecursiveCharacterTextSplitter
+DEFAULT_SEPARATORS = ('\n\n', '\n', ' ', '')
+
+
+class Chunk:
+    '''
+    A chunk of page text.
+
+    The chunk is the [start, end) span of page_text, which is shared by every chunk of the page, so no
+    text is copied until .text is read. source, page and index (position within the page) identify the
+    chunk; id is filled in by create_chunk_ids.
+    '''
+
+    __slots__ = ('page_text', 'start', 'end', 'source', 'page', 'index', 'id')
+
+    def __init__(self, page_text: str, start: int, end: int, source: str, page, index: int = 0, id: str = None):
+        self.page_text = page_text
+        self.start = start
+        self.end = end
+        self.source = source
+        self.page = page
+        self.index = index
+        self.id = id
+
+    @property
+    def text(self) -> str:
+        return self.page_text[self.start:self.end]
+
+    # Alias so code written against LangChain Documents keeps working
+    page_content = text
+
+    def __len__(self):
+        return self.end - self.start
+
+    def __repr__(self):
+        return f'Chunk(source={self.source!r}, page={self.page!r}, index={self.index}, span=({self.start}, {self.end}))'
+
+
+class RecursiveChunker:
+    """
+    Offset-based port of LangChain's RecursiveCharacterTextSplitter (keep_separator=True, strip_whitespace=True).
+
+    Text is split on the first separator present, pieces that are still too long are split recursively
+    with the remaining separators, and neighbouring pieces are merged into chunks of at most chunk_size
+    with up to chunk_overlap carried over. All of this is done on (start, end) offsets into the page text,
+    so chunk boundaries are identical to the LangChain splitter without building intermediate strings or
+    a Document per chunk.
+
+    Args:
+        chunk_size (int, optional): Maximum chunk length. Defaults to 500.
+        chunk_overlap (int, optional): Maximum overlap between consecutive chunks. Defaults to 100.
+        separators (sequence of str, optional): Separators to try in order. Defaults to DEFAULT_SEPARATORS.
+        length_function (callable, optional): Length of a piece of text. Defaults to the number of characters,
+            which is computed from offsets alone.
+    """
+
+    def __init__(self, chunk_size: int = 500, chunk_overlap: int = 100, separators=DEFAULT_SEPARATORS,
+                 length_function=None):
+        if chunk_overlap > chunk_size:
+            raise ValueError(f'Got a larger chunk overlap ({chunk_overlap}) than chunk size ({chunk_size}), should be smaller.')
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.separators = tuple(separators)
+        self.length_function = length_function
+
+    def _length(self, text: str, start: int, end: int) -> int:
+        if self.length_function is None:
+            return end - start
+        return self.length_function(text[start:end])
+
+    @staticmethod
+    def _split_on(text: str, start: int, end: int, separator: str):
+        '''Split [start, end) on separator, keeping each separator at the start of the following piece.'''
+        if not separator:
+            return [(i, i + 1) for i in range(start, end)]
+        spans = []
+        previous = start
+        position = text.find(separator, start, end)
+        while position != -1:
+            if position > previous:
+                spans.append((previous, position))
+            previous = position
+            position = text.find(separator, position + len(separator), end)
+        if end > previous:
+            spans.append((previous, end))
+        return spans
+
+    @staticmethod
+    def _strip(text: str, start: int, end: int):
+        while start < end and text[start].isspace():
+            start += 1
+        while end > start and text[end - 1].isspace():
+            end -= 1
+        return start, end
+
+    def _merge(self, text: str, spans, chunks):
+        '''Merge contiguous spans into chunks of at most chunk_size, appending them to chunks.'''
+        current = []
+        lengths = []
+        total = 0
+        for start, end in spans:
+            length = self._length(text, start, end)
+            if total + length > self.chunk_size and current:
+                chunk = self._strip(text, current[0][0], current[-1][1])
+                if chunk[1] > chunk[0]:
+                    chunks.append(chunk)
+                # Drop pieces from the front until what is left fits as overlap
+                drop = 0
+                while total > self.chunk_overlap or (total + length > self.chunk_size and total > 0):
+                    total -= lengths[drop]
+                    drop += 1
+                del current[:drop]
+                del lengths[:drop]
+            current.append((start, end))
+            lengths.append(length)
+            total += length
+        if current:
+            chunk = self._strip(text, current[0][0], current[-1][1])
+            if chunk[1] > chunk[0]:
+                chunks.append(chunk)
+
+    def _split(self, text: str, start: int, end: int, separators, chunks):
+        separator = separators[-1]
+        remaining = ()
+        for i, candidate in enumerate(separators):
+            if candidate == '':
+                separator = candidate
+                break
+            if text.find(candidate, start, end) != -1:
+                separator = candidate
+                remaining = separators[i + 1:]
+                break
+
+        good = []
+        for piece_start, piece_end in self._split_on(text, start, end, separator):
+            if self._length(text, piece_start, piece_end) < self.chunk_size:
+                good.append((piece_start, piece_end))
+                continue
+            if good:
+                self._merge(text, good, chunks)
+                good = []
+            if not remaining:
+                chunks.append((piece_start, piece_end))
+            else:
+                self._split(text, piece_start, piece_end, remaining, chunks)
+        if good:
+            self._merge(text, good, chunks)
+
+    def split_spans(self, text: str):
+        '''Return the (start, end) offsets of the chunks of text.'''
+        chunks = []
+        self._split(text, 0, len(text), self.separators, chunks)
+        return chunks
+
+    def split_text(self, text: str):
+        '''Return the chunks of text as strings, like RecursiveCharacterTextSplitter.split_text.'''
+        return [text[start:end] for start, end in self.split_spans(text)]
+
+    def chunk_page(self, text: str, source: str, page):
+        '''Split one page of text into Chunk records.'''
+        return [
+            Chunk(text, start, end, source, page, index)
+            for index, (start, end) in enumerate(self.split_spans(text))
+        ]
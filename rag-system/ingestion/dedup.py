@@ -0,0 +1,109 @@
+# ingestion/dedup.py
+# Exact and MinHash/LSH near-duplicate detection for chunks at ingest time
+
+from collections import defaultdict
+import hashlib
+import logging
+import zlib
+import numpy as np
+from utils.embedding_cache import normalize_text
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Mersenne prime used for the universal hash family; keeps a * h + b within uint64 for 32-bit h
+_PRIME = np.uint64((1 << 31) - 1)
+
+
+class ChunkDeduplicator:
+    """
+    Detects chunks whose text repeats one seen earlier in the same ingestion run.
+
+    Exact duplicates (after whitespace normalization) are found through a hash lookup. Near duplicates
+    are found with MinHash signatures over character shingles, bucketed by LSH bands; candidates sharing a
+    bucket are confirmed when their estimated Jaccard similarity reaches threshold. The first chunk seen
+    stays canonical and later copies map to it.
+
+    Args:
+        threshold (float, optional): Minimum estimated Jaccard similarity for a near duplicate. Defaults to 0.9.
+        num_perm (int, optional): Number of MinHash permutations. Defaults to 64.
+        bands (int, optional): Number of LSH bands; must divide num_perm. Defaults to 16.
+        shingle_size (int, optional): Length of character shingles. Defaults to 5.
+        seed (int, optional): Seed of the hash permutations, fixed so results are reproducible. Defaults to 1.
+    """
+
+    def __init__(self, threshold: float = 0.9, num_perm: int = 64, bands: int = 16, shingle_size: int = 5, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError(f'bands ({bands}) must divide num_perm ({num_perm})')
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, int(_PRIME), size=(num_perm, 1), dtype=np.uint64)
+        self._b = rng.integers(0, int(_PRIME), size=(num_perm, 1), dtype=np.uint64)
+        self._exact = {}
+        self._buckets = defaultdict(list)
+        self._ids = []
+        self._signatures = []
+        self.exact_duplicates = 0
+        self.near_duplicates = 0
+
+    def _shingle_hashes(self, text: str):
+        k = self.shingle_size
+        if len(text) <= k:
+            return np.array([zlib.crc32(text.encode('utf-8'))], dtype=np.uint64)
+        return np.fromiter(
+            (zlib.crc32(text[i:i + k].encode('utf-8')) for i in range(len(text) - k + 1)),
+            dtype=np.uint64, count=len(text) - k + 1,
+        )
+
+    def signature(self, text: str):
+        '''Return the MinHash signature of text as a uint32 array of length num_perm.'''
+        hashes = np.unique(self._shingle_hashes(text))
+        return ((self._a * hashes + self._b) % _PRIME).min(axis=1).astype(np.uint32)
+
+    def check(self, chunk_id: str, text: str):
+        '''
+        Return the ID of the canonical chunk that text duplicates, or None if it is new.
+
+        New chunks are registered under chunk_id so later copies map to them.
+        '''
+        normalized = normalize_text(text).lower()
+        digest = hashlib.sha1(normalized.encode('utf-8')).digest()
+        canonical = self._exact.get(digest)
+        if canonical is not None:
+            self.exact_duplicates += 1
+            return canonical
+
+        signature = self.signature(normalized)
+        band_keys = [
+            (band, signature[band * self.rows:(band + 1) * self.rows].tobytes())
+            for band in range(self.bands)
+        ]
+        seen = set()
+        for key in band_keys:
+            for candidate in self._buckets.get(key, ()):
+                if candidate in seen:
+                    continue
+                seen.add(candidate)
+                if np.mean(self._signatures[candidate] == signature) >= self.threshold:
+                    self.near_duplicates += 1
+                    return self._ids[candidate]
+
+        index = len(self._ids)
+        self._ids.append(chunk_id)
+        self._signatures.append(signature)
+        self._exact[digest] = chunk_id
+        for key in band_keys:
+            self._buckets[key].append(index)
+        return None
+
+    def stats(self):
+        '''Return the number of unique chunks and of exact and near duplicates found.'''
+        return {
+            'unique_chunks': len(self._ids),
+            'exact_duplicates': self.exact_duplicates,
+            'near_duplicates': self.near_duplicates,
+        }
@@ -2,92 +2,585 @@
 # Module for ingesting PDFs, chunking, embedding, and storing in Qdrant
 
 from pathlib import Path
+from itertools import islice
+from collections import deque, defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.document_loaders import PyPDFDirectoryLoader
-from qdrant_client.models import PointStruct
-from utils.embeddings import embed_text
-from utils.qdrant_utils import get_qdrant_client
-from config import ALLOWED_DIRECTORIES
+from langchain_community.document_loaders import PyPDFLoader
+from qdrant_client.models import PointIdsList
+from ingestion.chunker import Chunk, RecursiveChunker
+from ingestion.dedup import ChunkDeduplicator
+from ingestion.manifest import IngestManifest, file_hash, point_id
+from ingestion.pipeline import Stage, run_pipeline
+from ingestion.upserter import BatchUpserter
+from utils.embeddings import embed_array, get_embedding_pool, get_max_input_tokens, get_token_counter
+from utils.text_store import get_text_store
+from utils.projection import PCAProjection, get_projection, set_projection
+from utils.qdrant_utils import get_index_dimension, get_qdrant_client, supports_concurrent_upserts
+from utils.routing import CentroidAccumulator, delete_centroids, ensure_centroid_collection, upsert_centroids
+from config import ALLOWED_DIRECTORIES, EMBEDDING_BATCH_SIZE, INGEST_MANIFEST_PATH, INGEST_INCREMENTAL, INGEST_WINDOW, \
+    INGEST_MANIFEST_SAVE_INTERVAL, \
+    INGEST_WORKERS, INGEST_QUEUE_SIZE, CHUNKER, \
+    INGEST_DEDUP, DEDUP_THRESHOLD, DEDUP_NUM_PERM, DEDUP_BANDS, CHUNK_UNIT, EMBEDDING_POOL_MIN_BYTES, \
+    PCA_DIM, PCA_SAMPLE_SIZE, PCA_MIN_SAMPLES, ROUTING_CENTROIDS, UPSERT_WORKERS, INGEST_REPORT_TRUNCATION
 import logging
+import multiprocessing
+import time
+import numpy as np
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
-def load_and_chunk_pdf(directory: str, chunk_size: int = 500, chunk_overlap: int = 100):
-    '''Load PDFs from directory and split into chunks.'''
+def validate_directory(directory: str) -> Path:
+    '''Check that directory exists and is allowed for ingestion, returning its resolved path.'''
     pdf_path = Path(directory)
     if not pdf_path.is_dir():
         logger.error(f'Directory {directory} does not exist')
         raise ValueError(f'Directory {directory} does not exist')
-    if str(pdf_path.resolve()) not in ALLOWED_DIRECTORIES:
+    resolved = pdf_path.resolve()
+    if str(resolved) not in ALLOWED_DIRECTORIES:
         logger.error(f'Directory {directory} not in allowed list')
         raise ValueError(f'Directory {directory} not allowed')
-    
-    logger.info(f'Loading PDFs from {directory}')
-    doc_loader = PyPDFDirectoryLoader(pdf_path)
-    docs = doc_loader.load()
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=chunk_size,
-        chunk_overlap=chunk_overlap
+    return resolved
+
+
+def list_pdf_files(directory: str):
+    '''List visible PDF files under directory in a stable order, as PyPDFDirectoryLoader would.'''
+    root = validate_directory(directory)
+    return sorted(
+        path for path in root.glob('**/[!.]*.pdf')
+        if path.is_file() and not any(part.startswith('.') for part in path.relative_to(root).parts)
     )
-    return text_splitter.split_documents(docs)
 
 
-def create_chunk_ids(chunks):
-    '''Assign unique IDs to chunks based on source, page, and index.'''
+def iter_chunk_ids(chunks):
+    '''Assign unique IDs to chunks based on source, page, and index, yielding each chunk as it is labelled.'''
     last_page_id = None
     current_chunk_index = 0
     for chunk in chunks:
-        source = chunk.metadata.get('source')
-        page = chunk.metadata.get('page')
-        current_page_id = f'{source}:{page}'
+        current_page_id = f'{chunk.source}:{chunk.page}'
         if current_page_id == last_page_id:
             current_chunk_index += 1
         else:
             current_chunk_index = 0
-        chunk_id = f'{current_page_id}:{current_chunk_index}'
-        chunk.metadata['id'] = chunk_id
+        chunk.index = current_chunk_index
+        chunk.id = f'{current_page_id}:{current_chunk_index}'
         last_page_id = current_page_id
+        yield chunk
+
+
+def create_chunk_ids(chunks):
+    '''Assign unique IDs to chunks based on source, page, and index.'''
+    return list(iter_chunk_ids(chunks))
+
+
+def iter_pdf_pages(path):
+    '''Lazily yield the pages of a single PDF as LangChain Documents.'''
+    yield from PyPDFLoader(str(path)).lazy_load()
+
+
+def make_page_chunker(chunk_size: int = 500, chunk_overlap: int = 100, chunker: str = None, length_function=None):
+    '''
+    Return a function splitting a page Document into Chunk records.
+
+    The native chunker (default) works on offsets into the page text; 'langchain' runs
+    RecursiveCharacterTextSplitter and wraps its output, which yields the same boundaries.
+    length_function measures chunk_size and chunk_overlap (characters when None, e.g. a TokenCounter
+    for token-based chunking).
+    '''
+    chunker = chunker or CHUNKER
+    if chunker == 'native':
+        splitter = RecursiveChunker(chunk_size, chunk_overlap, length_function=length_function)
+        return lambda page: splitter.chunk_page(page.page_content, page.metadata.get('source'), page.metadata.get('page'))
+    if chunker == 'langchain':
+        text_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            length_function=length_function or len,
+        )
+        return lambda page: [
+            Chunk(text, 0, len(text), page.metadata.get('source'), page.metadata.get('page'), index)
+            for index, text in enumerate(text_splitter.split_text(page.page_content))
+        ]
+    raise ValueError(f'Unknown chunker: {chunker}')
+
+
+def iter_file_chunks(path, chunk_size: int = 500, chunk_overlap: int = 100, length_function=None):
+    '''Yield the chunks of a single PDF page by page, with IDs assigned, without loading the whole file.'''
+    chunk_page = make_page_chunker(chunk_size, chunk_overlap, length_function=length_function)
+    for page in iter_pdf_pages(path):
+        yield from iter_chunk_ids(chunk_page(page))
+
+
+def load_and_chunk_file(path, chunk_size: int = 500, chunk_overlap: int = 100, length_function=None):
+    '''Load a single PDF and split it into chunks.'''
+    chunk_page = make_page_chunker(chunk_size, chunk_overlap, length_function=length_function)
+    return [chunk for page in iter_pdf_pages(path) for chunk in chunk_page(page)]
+
+
+# Length function of the current chunking worker process, set once by the pool initializer
+_worker_length_function = None
+
+
+def _init_chunk_worker(length_function):
+    global _worker_length_function
+    _worker_length_function = length_function
+
+
+def _chunk_file_worker(path, chunk_size: int, chunk_overlap: int):
+    '''Process pool entry point: load, chunk and label a single PDF.'''
+    return create_chunk_ids(load_and_chunk_file(path, chunk_size, chunk_overlap, _worker_length_function))
+
+
+def iter_chunked_files(paths, chunk_size: int = 500, chunk_overlap: int = 100, workers: int = 1, length_function=None):
+    '''
+    Yield (path, chunks) for each PDF in paths, in the order given.
+
+    With workers > 1, files are parsed and chunked in a process pool with at most 2 * workers files in
+    flight; results are still yielded in input order, so chunk IDs are identical to a serial run.
+    length_function must be picklable to be sent to the spawned workers.
+    '''
+    if workers <= 1:
+        for path in paths:
+            yield path, iter_file_chunks(path, chunk_size, chunk_overlap, length_function)
+        return
+
+    # Spawned rather than forked: this runs on the pipeline's producer thread, next to the embed and upsert
+    # threads and the torch and tokenizers thread pools, none of which survive a fork safely
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                   initializer=_init_chunk_worker, initargs=(length_function,))
+    try:
+        remaining = iter(paths)
+        pending = deque(
+            (path, executor.submit(_chunk_file_worker, path, chunk_size, chunk_overlap))
+            for path in islice(remaining, 2 * workers)
+        )
+        while pending:
+            path, future = pending.popleft()
+            for next_path in islice(remaining, 1):
+                pending.append((next_path, executor.submit(_chunk_file_worker, next_path, chunk_size, chunk_overlap)))
+            yield path, future.result()
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def resolve_chunk_length(chunk_size: int, chunk_overlap: int, chunk_unit: str = None):
+    '''
+    Return (chunk_size, chunk_overlap, length_function) for the given chunk unit.
+
+    In 'tokens' mode sizes are counted with the embedding model's tokenizer and chunk_size is capped at
+    the model's maximum input length, so no chunk is silently truncated when embedded.
+    '''
+    chunk_unit = chunk_unit or CHUNK_UNIT
+    if chunk_unit == 'chars':
+        return chunk_size, chunk_overlap, None
+    if chunk_unit != 'tokens':
+        raise ValueError(f'Unknown chunk unit: {chunk_unit}')
+    max_tokens = get_max_input_tokens()
+    if chunk_size > max_tokens:
+        logger.warning(f'chunk_size {chunk_size} exceeds the model limit of {max_tokens} tokens, using {max_tokens}')
+        chunk_size = max_tokens
+    return chunk_size, min(chunk_overlap, chunk_size), get_token_counter()
+
+
+def load_and_chunk_pdf(directory: str, chunk_size: int = 500, chunk_overlap: int = 100, workers: int = 1,
+                       chunk_unit: str = None):
+    '''Load PDFs from directory and split into chunks of chunk_unit, parsing up to workers files in parallel.'''
+    files = list_pdf_files(directory)
+    logger.info(f'Loading {len(files)} PDFs from {directory}')
+    chunk_size, chunk_overlap, length_function = resolve_chunk_length(chunk_size, chunk_overlap, chunk_unit)
+    chunks = []
+    for _, file_chunks in iter_chunked_files(files, chunk_size, chunk_overlap, workers, length_function):
+        chunks.extend(file_chunks)
     return chunks
 
 
-def ingest_pdfs(directory: str, chunk_size: int = 500, chunk_overlap: int = 100, client=None):
+def batched(iterable, size: int):
+    '''Yield lists of up to size items from iterable.'''
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def embed_chunks(chunks, batch_size: int = EMBEDDING_BATCH_SIZE, pool=None):
+    '''
+    Embed chunk texts in batches of batch_size, returning a float32 array with one row per chunk.
+
+    With an embedding pool, each call hands one batch_size slice to every worker process.
+    '''
+    step = batch_size * pool.workers if pool is not None else batch_size
+    batches = [
+        embed_array([chunk.text for chunk in batch], batch_size=batch_size, use_pool=pool is not None)
+        for batch in batched(chunks, step)
+    ]
+    return np.concatenate(batches) if len(batches) != 1 else batches[0]
+
+
+# Bumped when chunk_payload gains fields, so points stored by older versions are re-ingested
+PAYLOAD_VERSION = 2
+
+
+def chunk_payload(chunk, doc_hash: str = None, mtime: float = None, include_text: bool = True):
+    '''
+    Build the payload stored with a chunk's point, including its page and its file's content hash and mtime.
+
+    With include_text=False the text is left out, for chunks whose text lives in the text store.
+    '''
+    payload = {'text': chunk.text} if include_text else {}
+    return {
+        **payload,
+        'source': chunk.source,
+        'chunk_id': chunk.id,
+        'page': chunk.page,
+        'doc_hash': doc_hash,
+        'mtime': mtime,
+    }
+
+
+def delete_points(client, collection: str, point_ids):
+    '''Delete the given point IDs from the collection, if any.'''
+    if point_ids:
+        client.delete(collection_name=collection, points_selector=PointIdsList(points=list(point_ids)))
+
+
+def ingest_pdfs(directory: str, chunk_size: int = 500, chunk_overlap: int = 100, client=None, batch_size: int = None,
+                incremental: bool = None, manifest_path: str = None, window: int = None, workers: int = None,
+                queue_size: int = None, dedup: bool = None, chunk_unit: str = None):
     """
     Processes all PDF files in a specified directory by loading, chunking, embedding, and storing their content in a Qdrant vector database.
 
+    Files are streamed through concurrent parse, embed and upsert stages, so memory stays flat regardless of corpus
+    size. Points get stable IDs derived from their 'source:page:index' chunk IDs, and a per-file manifest of content
+    hashes and point IDs makes re-runs incremental: unchanged files are skipped, and points of changed or removed
+    files that no longer exist are deleted. A file is committed to the manifest once all of its points are upserted.
+
+    Optional behaviour follows the configuration: the embedding pool for large runs, batched and retried (and, against
+    a Qdrant server, concurrent) upserts, PCA_DIM projection, ROUTING_CENTROIDS and the TEXT_STORE.
+
     Args:
         directory (str): Path to the directory containing PDF files to ingest.
-        chunk_size (int, optional): Number of characters per text chunk. Defaults to 500.
-        chunk_overlap (int, optional): Number of overlapping characters between chunks. Defaults to 100.
+        chunk_size (int, optional): Number of characters (or tokens) per text chunk. Defaults to 500.
+        chunk_overlap (int, optional): Number of overlapping characters (or tokens) between chunks. Defaults to 100.
         client (optional): Existing Qdrant client instance. Pass a custom client for testing or specific configurations.
+        batch_size (int, optional): Chunks per embedding call. Defaults to EMBEDDING_BATCH_SIZE.
+        incremental (bool, optional): Skip files whose content hash is unchanged. Defaults to INGEST_INCREMENTAL.
+        manifest_path (str, optional): Location of the ingestion manifest. Defaults to INGEST_MANIFEST_PATH.
+        window (int, optional): Embedded points buffered before they are upserted. Defaults to INGEST_WINDOW.
+        workers (int, optional): Processes used to parse and chunk PDFs. Defaults to INGEST_WORKERS.
+        queue_size (int, optional): Batches waiting between two stages. Defaults to INGEST_QUEUE_SIZE.
+        dedup (bool, optional): Store exact and near-duplicate chunks only once, recording the sources of the copies
+            in the canonical point's 'duplicate_sources' payload. Defaults to INGEST_DEDUP.
+        chunk_unit (str, optional): 'chars' or 'tokens' (counted with the embedding model's tokenizer).
+            Defaults to CHUNK_UNIT.
 
     Returns:
-        dict: A dictionary containing the status of the operation, the number of chunks added, and the source directory.
+        dict: The status, chunks added, source directory, files skipped and removed, throughput in chunks per second,
+              upsert statistics, stage utilization, chunks truncated by the model (with INGEST_REPORT_TRUNCATION),
+              and dedup counts when enabled.
 
     Raises:
         Exception: If any error occurs during the ingestion process.
     """
 
     try:
+        batch_size = batch_size or EMBEDDING_BATCH_SIZE
+        window = window or INGEST_WINDOW
+        workers = workers or INGEST_WORKERS
+        queue_size = queue_size or INGEST_QUEUE_SIZE
+        dedup = INGEST_DEDUP if dedup is None else dedup
+        chunk_unit = chunk_unit or CHUNK_UNIT
+        chunk_size, chunk_overlap, length_function = resolve_chunk_length(chunk_size, chunk_overlap, chunk_unit)
+        if batch_size <= 0:
+            raise ValueError('batch_size must be positive')
+        if window <= 0:
+            raise ValueError('window must be positive')
+        incremental = INGEST_INCREMENTAL if incremental is None else incremental
         client, collection = get_qdrant_client(client)
-        chunks = load_and_chunk_pdf(directory, chunk_size, chunk_overlap)
-        chunks_with_ids = create_chunk_ids(chunks)
-        points = [
-            PointStruct(
-                id=i,
-                vector=embed_text(chunk.page_content),
-                payload={
-                    'text': chunk.page_content,
-                    'source': chunk.metadata.get('source'),
-                    'chunk_id': chunk.metadata.get('id'),
-                }
-            ) for i, chunk in enumerate(chunks_with_ids)
-        ]
-        client.upsert(collection_name=collection, points=points)
-        logger.info(f'Added {len(chunks)} chunks to Qdrant from {directory}')
-        return {'status': 'success', 'chunks_added': len(chunks), 'directory': directory}
+        files = list_pdf_files(directory)
+
+        manifest = IngestManifest(manifest_path or INGEST_MANIFEST_PATH)
+        params = {'chunk_size': chunk_size, 'chunk_overlap': chunk_overlap, 'chunk_unit': chunk_unit,
+                  'payload_version': PAYLOAD_VERSION}
+        text_store = get_text_store()
+        if text_store is not None:
+            # Points ingested with the text in their payload must be re-ingested to move it
+            params['text_store'] = True
+        if ROUTING_CENTROIDS:
+            # Files ingested without centroids must be re-ingested to get one
+            params['centroids'] = True
+            ensure_centroid_collection(client, collection, get_index_dimension())
+        if manifest.params != params:
+            if manifest.files:
+                logger.info('Chunking settings or payload format changed since last ingestion, re-ingesting all files')
+            # Old entries are kept, so their points are replaced or deleted as each file is re-ingested
+            manifest.invalidate(params)
+        elif manifest.files and client.count(collection_name=collection, exact=True).count == 0:
+            logger.info(f'Collection {collection} is empty, ignoring stale manifest')
+            manifest.reset(params)
+        projection = get_projection()
+        if PCA_DIM and projection is None and manifest.files:
+            logger.info('No PCA projection found for the collection, re-ingesting all files')
+            manifest.invalidate(params)
+
+        # Drop points of files that disappeared from the directory
+        current_sources = {str(path) for path in files}
+        removed = [source for source in manifest.sources_under(directory) if source not in current_sources]
+        for source in removed:
+            removed_ids = manifest.remove(source)
+            delete_points(client, collection, removed_ids)
+            if text_store is not None:
+                text_store.delete(removed_ids)
+        if ROUTING_CENTROIDS:
+            delete_centroids(client, collection, removed)
+        if removed:
+            logger.info(f'Removed points for {len(removed)} deleted files')
+
+        changed = {}
+        for path in files:
+            source = str(path)
+            stat = path.stat()
+            unchanged, digest = manifest.is_unchanged(source, stat, lambda: file_hash(path)) if incremental else (False, None)
+            if unchanged:
+                manifest.update_stat(source, digest, stat)
+            else:
+                changed[source] = (path, stat, digest or file_hash(path))
+
+        # Files deduplicated against a changed or removed file lost their canonical copy, so re-ingest them too
+        invalidated = set(removed) | set(changed)
+        while invalidated:
+            dependents = [
+                path for path in files
+                if str(path) not in changed and invalidated & set(manifest.get(str(path)).get('duplicate_of', ()))
+            ]
+            for path in dependents:
+                entry = manifest.get(str(path))
+                changed[str(path)] = (path, path.stat(), entry['hash'])
+            invalidated = {str(path) for path in dependents}
+        changed = [(path, source, stat, digest) for source, (path, stat, digest) in sorted(changed.items())]
+        # File-level metadata copied into every chunk's payload, for filtered search
+        file_metadata = {source: (digest, stat.st_mtime) for _, source, stat, digest in changed}
+
+        skipped = len(files) - len(changed)
+        if skipped:
+            logger.info(f'Skipped {skipped} unchanged files')
+
+        # Large runs are worth the start-up cost of the multi-process embedding pool
+        changed_bytes = sum(stat.st_size for _, _, stat, _ in changed)
+        pool = get_embedding_pool() if changed and changed_bytes >= EMBEDDING_POOL_MIN_BYTES else None
+        embed_batch_size = batch_size * pool.workers if pool is not None else batch_size
+        # In character mode, optionally count the chunks the model will truncate; only the tokenizer is loaded
+        report_truncation = INGEST_REPORT_TRUNCATION and chunk_unit == 'chars' and bool(changed)
+        token_counter = get_token_counter() if report_truncation else None
+        max_tokens = get_max_input_tokens() if report_truncation else None
+
+        deduplicator = ChunkDeduplicator(DEDUP_THRESHOLD, DEDUP_NUM_PERM, DEDUP_BANDS) if dedup else None
+        # Canonical chunk ID -> sources of the duplicates that were not stored
+        duplicate_sources = defaultdict(set)
+
+        # Files whose chunks have all been produced; handed downstream with the batch that completed them
+        finished = []
+
+        def chunk_stream():
+            chunked_files = iter_chunked_files([path for path, _, _, _ in changed], chunk_size, chunk_overlap, workers,
+                                               length_function)
+            for (path, source, stat, digest), (_, file_chunks) in zip(changed, chunked_files):
+                ids = []
+                duplicate_of = set()
+                for chunk in file_chunks:
+                    if deduplicator is not None:
+                        canonical = deduplicator.check(chunk.id, chunk.text)
+                        if canonical is not None:
+                            canonical_source = canonical.rsplit(':', 2)[0]
+                            if canonical_source != source:
+                                duplicate_sources[canonical].add(source)
+                                duplicate_of.add(canonical_source)
+                            continue
+                    ids.append(point_id(chunk.id))
+                    yield chunk
+                entry = manifest.get(source)
+                stale_ids = set(entry['point_ids']) - set(ids) if entry else set()
+                finished.append((source, digest, stat, ids, stale_ids, duplicate_of))
+
+        def batch_stream():
+            # A file is only marked finished while the batch holding its last chunk is being cut,
+            # so attaching the finished files to that batch keeps manifest commits behind their points
+            for batch in batched(chunk_stream(), embed_batch_size):
+                yield batch, finished[:]
+                finished.clear()
+            if finished:
+                yield [], finished[:]
+
+        counts = {'chunks_added': 0, 'chunks_truncated': 0}
+
+        def embed(item):
+            batch, files_done = item
+            vectors = embed_chunks(batch, batch_size, pool) if batch else None
+            if token_counter is not None and batch:
+                counts['chunks_truncated'] += sum(
+                    n > max_tokens for n in token_counter.count_many(chunk.text for chunk in batch)
+                )
+            return batch, vectors, files_done
+
+        buffer = {'ids': [], 'vectors': [], 'payloads': [], 'texts': []}
+        committable = []
+        centroids = CentroidAccumulator() if ROUTING_CENTROIDS else None
+        upserter = BatchUpserter(client, collection, workers=UPSERT_WORKERS if supports_concurrent_upserts() else 1)
+        # (upsert futures, files completed by those points), oldest first
+        in_flight = deque()
+        last_save = time.monotonic()
+
+        def flush():
+            futures = []
+            if buffer['ids']:
+                if text_store is not None:
+                    # Texts go first so a point is never visible without its text
+                    text_store.put_many(zip(buffer['ids'], buffer['texts']))
+                futures = upserter.submit(buffer['ids'], np.concatenate(buffer['vectors']), buffer['payloads'])
+                for values in buffer.values():
+                    values.clear()
+            in_flight.append((futures, committable[:]))
+            committable.clear()
+            commit_acknowledged()
+
+        def commit_acknowledged(wait: bool = False):
+            # Files are committed in order, each once the batches holding its points and all earlier
+            # batches are acknowledged
+            files = []
+            while in_flight and (wait or all(future.done() for future in in_flight[0][0])):
+                futures, files_done = in_flight.popleft()
+                for future in futures:
+                    future.result()  # Re-raises a batch that failed all its retries
+                files.extend(files_done)
+            if files:
+                commit(files)
+
+        def commit(files):
+            nonlocal last_save
+            finished_centroids, empty_sources = {}, []
+            for source, digest, stat, ids, stale_ids, duplicate_of in files:
+                delete_points(client, collection, stale_ids)
+                if text_store is not None:
+                    text_store.delete(stale_ids)
+                manifest.set(source, digest, stat, ids, duplicate_of)
+                if centroids is not None:
+                    centroid, count = centroids.pop(source)
+                    if centroid is None:
+                        empty_sources.append(source)
+                    else:
+                        finished_centroids[source] = (centroid, count)
+            if centroids is not None:
+                upsert_centroids(client, collection, finished_centroids)
+                delete_centroids(client, collection, empty_sources)
+            # Rewriting the whole manifest per window would cost quadratic I/O on large corpora; files committed
+            # since the last save are simply re-ingested (idempotently) after a crash
+            if time.monotonic() - last_save >= INGEST_MANIFEST_SAVE_INTERVAL:
+                manifest.save()
+                last_save = time.monotonic()
+
+        def close():
+            if pending:
+                fit_projection()
+            flush()
+            commit_acknowledged(wait=True)
+            # Removed files and refreshed stats are recorded even when no file was re-ingested
+            manifest.save()
+            # Canonical points are all stored by now; record where their duplicates came from
+            for canonical, sources in duplicate_sources.items():
+                client.set_payload(
+                    collection_name=collection,
+                    payload={'duplicate_sources': sorted(sources)},
+                    points=[point_id(canonical)],
+                )
+
+        # Full-dimension batches held back until the PCA projection has been fitted on them
+        pending = []
+
+        def fit_projection():
+            nonlocal projection
+            sample = [vectors for _, vectors, _ in pending if vectors is not None]
+            sample_size = sum(len(vectors) for vectors in sample)
+            if sample_size and sample_size < max(PCA_DIM, PCA_MIN_SAMPLES):
+                # Too few embeddings for a projection the collection keeps for good; store nothing from this run,
+                # so its files stay uncommitted and are embedded again (with whatever is new) next time
+                logger.warning(f'Only {sample_size} chunks to fit the PCA projection on, at least '
+                               f'{max(PCA_DIM, PCA_MIN_SAMPLES)} are needed; not storing this run\'s chunks yet')
+                pending.clear()
+                return
+            if sample:
+                projection = PCAProjection.fit(np.concatenate(sample)[:PCA_SAMPLE_SIZE], PCA_DIM)
+                set_projection(projection)
+            items = pending[:]
+            pending.clear()
+            for item in items:
+                store(item)
+
+        def upsert(item):
+            if PCA_DIM and projection is None:
+                pending.append(item)
+                if sum(len(batch) for batch, _, _ in pending) >= PCA_SAMPLE_SIZE:
+                    fit_projection()
+            else:
+                store(item)
+
+        def store(item):
+            batch, vectors, files_done = item
+            if batch:
+                if projection is not None:
+                    vectors = projection.transform(vectors)
+                buffer['ids'].extend(point_id(chunk.id) for chunk in batch)
+                buffer['vectors'].append(vectors)
+                if centroids is not None:
+                    centroids.add([chunk.source for chunk in batch], vectors)
+                buffer['payloads'].extend(
+                    chunk_payload(chunk, *file_metadata[chunk.source], include_text=text_store is None) for chunk in batch
+                )
+                if text_store is not None:
+                    buffer['texts'].extend(chunk.text for chunk in batch)
+            committable.extend(files_done)
+            counts['chunks_added'] += len(batch)
+            if len(buffer['ids']) >= window:
+                flush()
+            elif in_flight:
+                commit_acknowledged()
+
+        try:
+            stats = run_pipeline(
+                batch_stream(),
+                [Stage('embed', embed), Stage('upsert', upsert, close=close)],
+                queue_size=queue_size,
+                source_name='parse',
+            )
+        finally:
+            upserter.close()
+        upsert_stats = upserter.stats()
+        chunks_added = counts['chunks_added']
+        wall_seconds = stats['wall_seconds']
+        chunks_per_second = chunks_added / wall_seconds if wall_seconds > 0 else 0.0
+        utilization = {name: stage['utilization'] for name, stage in stats['stages'].items()}
+        if chunks_added:
+            logger.info(f'Ingested {chunks_added} chunks in {wall_seconds:.2f}s ({chunks_per_second:.1f} chunks/sec, '
+                        f'batch size {batch_size}, stage utilization {utilization})')
+            logger.info(f'Upserted {upsert_stats["points"]} points in {upsert_stats["batches"]} batches '
+                        f'({upsert_stats["points_per_second"]:.1f} points/sec, {upsert_stats["retries"]} retries, '
+                        f'{upserter.workers} workers)')
+        if counts['chunks_truncated']:
+            logger.warning(f'{counts["chunks_truncated"]} of {chunks_added} chunks exceed the model limit of {max_tokens} '
+                           f'tokens and were truncated when embedded; consider chunk_unit=\'tokens\'')
+        logger.info(f'Added {chunks_added} chunks to Qdrant from {directory}')
+        return {
+            'status': 'success',
+            'chunks_added': chunks_added,
+            'directory': directory,
+            'files_skipped': skipped,
+            'files_removed': len(removed),
+            'chunks_per_second': round(chunks_per_second, 1),
+            'upsert': upsert_stats,
+            'stage_utilization': utilization,
+            'chunks_truncated': counts['chunks_truncated'],
+            **({'dedup': deduplicator.stats()} if deduplicator is not None else {}),
+        }
     except Exception as e:
         logger.error(f'Ingestion failed for {directory}: {str(e)}')
-        raise
\ No newline at end of file
+        raise
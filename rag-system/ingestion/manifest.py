@@ -0,0 +1,121 @@
+# ingestion/manifest.py
+# Per-file content-hash manifest used for incremental, idempotent ingestion
+
+from pathlib import Path
+import hashlib
+import json
+import logging
+import os
+from utils.ids import point_id  # Re-exported: ingestion maps chunk IDs to point IDs through the manifest
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 1
+
+
+def file_hash(path, block_size: int = 1 << 20) -> str:
+    '''Return the SHA-256 hex digest of a file's contents.'''
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class IngestManifest:
+    '''
+    Mapping of source file -> content hash and the point IDs ingested from it.
+
+    The manifest is a JSON file of the form::
+
+        {"version": 1, "params": {...}, "files": {source: {"hash", "size", "mtime_ns", "point_ids", "duplicate_of"}}}
+
+    "params" records the chunking settings the entries were produced with, so a change in
+    settings invalidates every entry. "duplicate_of" lists the sources holding the canonical copy
+    of chunks that were deduplicated away from this file.
+    '''
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.params = {}
+        self.files = {}
+        if self.path.exists():
+            try:
+                data = json.loads(self.path.read_text(encoding='utf-8'))
+                if data.get('version') == MANIFEST_VERSION:
+                    self.params = data.get('params', {})
+                    self.files = data.get('files', {})
+                else:
+                    logger.warning(f'Ignoring manifest {self.path} with unsupported version {data.get("version")}')
+            except (OSError, ValueError) as e:
+                logger.warning(f'Ignoring unreadable manifest {self.path}: {str(e)}')
+
+    def get(self, source: str):
+        '''Return the entry for source, or None if it has not been ingested.'''
+        return self.files.get(source)
+
+    def set(self, source: str, digest: str, stat, point_ids, duplicate_of=()):
+        '''Record that source with the given hash and os.stat result produced point_ids.'''
+        self.files[source] = {
+            'hash': digest,
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'point_ids': list(point_ids),
+            'duplicate_of': sorted(duplicate_of),
+        }
+
+    def update_stat(self, source: str, digest: str, stat):
+        '''Refresh the recorded hash, size and mtime of an unchanged source, keeping its points.'''
+        self.files[source].update(hash=digest, size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+
+    def remove(self, source: str):
+        '''Forget source and return the point IDs it owned.'''
+        entry = self.files.pop(source, None)
+        return entry['point_ids'] if entry else []
+
+    def sources_under(self, directory: str):
+        '''Return the recorded sources that live inside directory.'''
+        prefix = str(Path(directory).resolve()) + os.sep
+        return [source for source in self.files if source.startswith(prefix)]
+
+    def is_unchanged(self, source: str, stat, digest_fn):
+        '''
+        Check whether source matches its recorded entry.
+
+        Size and mtime are compared first so unchanged files are not re-read; the content hash
+        is only computed (via digest_fn) when they differ. Returns (unchanged, digest), where digest
+        is the recorded hash if hashing was skipped, or None if source has no entry or the entry is stale.
+        '''
+        entry = self.files.get(source)
+        if entry is None or entry.get('stale'):
+            return False, None
+        if entry.get('size') == stat.st_size and entry.get('mtime_ns') == stat.st_mtime_ns:
+            return True, entry['hash']
+        digest = digest_fn()
+        return digest == entry['hash'], digest
+
+    def invalidate(self, params=None):
+        '''
+        Mark every entry stale and switch to params, e.g. when chunking settings change.
+
+        Stale entries keep their point IDs, so re-ingesting a file still deletes the points the new
+        settings no longer produce, and a file removed later still has its points deleted.
+        '''
+        for entry in self.files.values():
+            entry['stale'] = True
+        self.params = dict(params or {})
+
+    def reset(self, params=None):
+        '''Drop every entry, e.g. when chunking settings change or the collection was wiped.'''
+        self.files = {}
+        self.params = dict(params or {})
+
+    def save(self):
+        '''Atomically write the manifest to disk.'''
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(self.path.suffix + '.tmp')
+        data = {'version': MANIFEST_VERSION, 'params': self.params, 'files': self.files}
+        tmp_path.write_text(json.dumps(data), encoding='utf-8')
+        os.replace(tmp_path, self.path)
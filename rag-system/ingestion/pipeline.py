@@ -0,0 +1,146 @@
+# ingestion/pipeline.py
+# Minimal threaded producer/consumer engine used to overlap ingestion stages
+
+import logging
+import queue
+import threading
+import time
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Sentinel passed downstream when a stage has no more items
+_DONE = object()
+
+# How often blocked threads re-check whether another stage failed
+_POLL_SECONDS = 0.1
+
+
+class Stage:
+    '''
+    A pipeline stage running in its own thread.
+
+    process(item) is called for every item from the upstream queue and its return value is passed
+    to the next stage. close(), if given, runs once in the same thread after the last item, e.g. to
+    flush buffered work.
+    '''
+
+    def __init__(self, name: str, process, close=None):
+        self.name = name
+        self.process = process
+        self.close = close
+        self.busy_seconds = 0.0
+        self.items = 0
+
+
+def run_pipeline(source, stages, queue_size: int = 4, source_name: str = 'source'):
+    """
+    Run source -> stages[0] -> ... -> stages[-1] concurrently, connected by bounded queues.
+
+    Each stage only blocks on its neighbours when a queue is full or empty, so a slow stage never
+    stalls work that could proceed upstream. If any stage raises, the others are stopped and the
+    first exception is re-raised in the calling thread.
+
+    Args:
+        source (iterable): Items fed to the first stage; iterated in a dedicated thread.
+        stages (list of Stage): Stages to run, in order.
+        queue_size (int, optional): Maximum number of items waiting between two stages. Defaults to 4.
+        source_name (str, optional): Name reported for the source in the stats. Defaults to 'source'.
+
+    Returns:
+        dict: Wall time and, per stage, the busy seconds, number of items and utilization (busy / wall).
+    """
+    stop = threading.Event()
+    errors = []
+    queues = [queue.Queue(maxsize=queue_size) for _ in stages]
+    producer = Stage(source_name, None)
+
+    def put(q, item):
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=_POLL_SECONDS)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def get(q):
+        while not stop.is_set():
+            try:
+                return q.get(timeout=_POLL_SECONDS)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def fail(stage, e):
+        logger.error(f'Pipeline stage {stage.name} failed: {str(e)}')
+        errors.append(e)
+        stop.set()
+
+    def produce():
+        iterator = iter(source)
+        try:
+            while not stop.is_set():
+                start = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    break
+                finally:
+                    producer.busy_seconds += time.perf_counter() - start
+                producer.items += 1
+                if not put(queues[0], item):
+                    break
+        except BaseException as e:
+            fail(producer, e)
+        finally:
+            if hasattr(iterator, 'close'):
+                iterator.close()
+            put(queues[0], _DONE)
+
+    def consume(index, stage):
+        downstream = queues[index + 1] if index + 1 < len(stages) else None
+        try:
+            while (item := get(queues[index])) is not _DONE:
+                start = time.perf_counter()
+                result = stage.process(item)
+                stage.busy_seconds += time.perf_counter() - start
+                stage.items += 1
+                if downstream is not None and not put(downstream, result):
+                    return
+            if stage.close is not None and not stop.is_set():
+                start = time.perf_counter()
+                stage.close()
+                stage.busy_seconds += time.perf_counter() - start
+        except BaseException as e:
+            fail(stage, e)
+        finally:
+            if downstream is not None:
+                put(downstream, _DONE)
+
+    wall_start = time.perf_counter()
+    threads = [threading.Thread(target=produce, name=f'pipeline-{source_name}', daemon=True)]
+    threads += [
+        threading.Thread(target=consume, args=(i, stage), name=f'pipeline-{stage.name}', daemon=True)
+        for i, stage in enumerate(stages)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall_seconds = time.perf_counter() - wall_start
+
+    if errors:
+        raise errors[0]
+
+    return {
+        'wall_seconds': round(wall_seconds, 3),
+        'stages': {
+            stage.name: {
+                'busy_seconds': round(stage.busy_seconds, 3),
+                'items': stage.items,
+                'utilization': round(stage.busy_seconds / wall_seconds, 3) if wall_seconds > 0 else 0.0,
+            } for stage in [producer, *stages]
+        },
+    }
@@ -0,0 +1,302 @@
+# ingestion/snapshot.py
+# Export and import of a collection as one versioned file, for warming new nodes without re-ingesting
+
+from pathlib import Path
+from types import SimpleNamespace
+import json
+import logging
+import os
+import struct
+import time
+import uuid
+import zlib
+import numpy as np
+from ingestion.manifest import IngestManifest
+from ingestion.upserter import BatchUpserter
+from utils.projection import PCAProjection, get_projection, set_projection
+from utils.qdrant_utils import get_index_dimension, get_qdrant_client, reset_qdrant_client, supports_concurrent_upserts
+from utils.routing import CentroidAccumulator, centroid_collection_name, ensure_centroid_collection, upsert_centroids
+from utils.text_store import get_text_store
+from config import EMBEDDING_MODEL, INGEST_MANIFEST_PATH, ROUTING_CENTROIDS, TEXT_STORE, UPSERT_WORKERS
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+MAGIC = b'RAGSNAP\0'
+SNAPSHOT_VERSION = 1
+
+# Magic, then the offset and length of the JSON header, which is written last
+_PREAMBLE = struct.Struct('<8sQQ')
+# Sections start on this boundary so the vector matrix can be memory-mapped and read with aligned loads
+_ALIGNMENT = 64
+# Points read from the store, or sent to it, per step
+_PAGE_SIZE = 1024
+_IMPORT_STEP = 8192
+
+
+def _pad(f):
+    f.write(b'\0' * (-f.tell() % _ALIGNMENT))
+
+
+def _write_section(f, data: bytes, **info):
+    '''Append an aligned section and return its header entry.'''
+    _pad(f)
+    offset = f.tell()
+    f.write(data)
+    return {'offset': offset, 'length': len(data), 'crc32': zlib.crc32(data), **info}
+
+
+def export_snapshot(path: str, client=None):
+    """
+    Write every point of the collection to a snapshot file.
+
+    Layout: a fixed preamble (magic plus the position of the JSON header), then sections aligned to 64 bytes:
+    the vectors as a raw little-endian float32 (count, dimension) matrix, the point IDs as 16-byte UUIDs, and the
+    payloads as zlib-compressed JSON lines, followed by the PCA projection and the ingestion manifest when present.
+    The JSON header comes last and records the format version, the embedding model and the offset, length and
+    CRC32 of each section. Texts kept in the text store are written back into the payloads, so the file is
+    self-contained and can seed any backend; a point whose text cannot be found fails the export. The file is written next to path and renamed into place.
+
+    Args:
+        path (str): Snapshot file to write.
+        client (optional): Existing client instance. Defaults to the shared client.
+
+    Returns:
+        dict: The snapshot path, number of points, dimension, file size in bytes and seconds taken.
+    """
+    try:
+        start = time.perf_counter()
+        client, collection = get_qdrant_client(client)
+        text_store = get_text_store()
+        dimension = get_index_dimension()
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + '.tmp')
+        ids = bytearray()
+        compressor = zlib.compressobj(6)
+        payloads = []
+        count = 0
+        vectors_crc = 0
+        with open(tmp_path, 'wb') as f:
+            f.write(b'\0' * _ALIGNMENT)  # Preamble, filled in once the header position is known
+            vectors_offset = f.tell()
+            offset = None
+            while True:
+                records, offset = client.scroll(collection_name=collection, limit=_PAGE_SIZE, offset=offset,
+                                                with_payload=True, with_vectors=True)
+                if records:
+                    vectors = np.asarray([record.vector for record in records], dtype='<f4')
+                    if vectors.shape[1] != dimension:
+                        raise ValueError(f'Collection {collection} stores {vectors.shape[1]}-d vectors, expected {dimension}')
+                    data = vectors.tobytes()
+                    f.write(data)
+                    vectors_crc = zlib.crc32(data, vectors_crc)
+                    missing = [record.id for record in records if 'text' not in (record.payload or {})]
+                    texts = text_store.get_many(missing) if text_store is not None and missing else {}
+                    if len(texts) != len(missing):
+                        # Without its texts the snapshot would not be self-contained
+                        raise ValueError(f'{len(missing) - len(texts)} points have no text in their payload and none '
+                                         f'in the text store; export from a node with TEXT_STORE enabled')
+                    for record in records:
+                        ids += uuid.UUID(str(record.id)).bytes
+                        payload = dict(record.payload or {})
+                        if record.id in texts:
+                            payload['text'] = texts[record.id]
+                        payloads.append(compressor.compress(json.dumps(payload).encode('utf-8') + b'\n'))
+                    count += len(records)
+                if offset is None:
+                    break
+            header = {
+                'format': 'rag-snapshot',
+                'version': SNAPSHOT_VERSION,
+                'collection': collection,
+                'embedding_model': EMBEDDING_MODEL,
+                'dimension': dimension,
+                'count': count,
+                'created': time.time(),
+                'vectors': {'offset': vectors_offset, 'length': f.tell() - vectors_offset, 'crc32': vectors_crc,
+                            'dtype': '<f4', 'shape': [count, dimension]},
+            }
+            header['ids'] = _write_section(f, bytes(ids), encoding='uuid16')
+            payloads.append(compressor.flush())
+            header['payloads'] = _write_section(f, b''.join(payloads), codec='zlib', format='jsonl')
+            projection = get_projection()
+            if projection is not None:
+                header['projection'] = _write_section(
+                    f, projection.components.astype('<f4').tobytes(), dtype='<f4', shape=list(projection.components.shape),
+                    model_name=projection.model_name, explained_variance_ratio=projection.explained_variance_ratio,
+                )
+            manifest = IngestManifest(INGEST_MANIFEST_PATH)
+            if manifest.files:
+                header['manifest'] = _write_section(
+                    f, zlib.compress(json.dumps({'params': manifest.params, 'files': manifest.files}).encode('utf-8')),
+                    codec='zlib',
+                )
+            encoded = json.dumps(header).encode('utf-8')
+            header_offset = f.tell()
+            f.write(encoded)
+            f.seek(0)
+            f.write(_PREAMBLE.pack(MAGIC, header_offset, len(encoded)))
+        os.replace(tmp_path, path)
+        seconds = time.perf_counter() - start
+        size = path.stat().st_size
+        logger.info(f'Exported {count} points of {collection} to {path} ({size} bytes) in {seconds:.2f}s')
+        return {'path': str(path), 'points': count, 'dimension': dimension, 'bytes': size, 'seconds': round(seconds, 2)}
+    except Exception as e:
+        logger.error(f'Snapshot export to {path} failed: {str(e)}')
+        Path(path).with_name(Path(path).name + '.tmp').unlink(missing_ok=True)
+        raise
+
+
+def _read_section(path: Path, section, verify: bool = True):
+    with open(path, 'rb') as f:
+        f.seek(section['offset'])
+        data = f.read(section['length'])
+    if len(data) != section['length'] or (verify and zlib.crc32(data) != section['crc32']):
+        raise ValueError(f'Snapshot {path} is truncated or corrupt')
+    return data
+
+
+def open_snapshot(path: str, verify: bool = True):
+    '''
+    Open a snapshot file, returning its header, its vectors as a read-only memory map, and its IDs and payloads.
+
+    The projection and manifest are None when the snapshot has none. With verify, every section's CRC32 is checked.
+
+    Raises:
+        ValueError: If the file is not a snapshot, has an unsupported version, or is truncated or corrupt.
+    '''
+    path = Path(path)
+    with open(path, 'rb') as f:
+        preamble = f.read(_PREAMBLE.size)
+    if len(preamble) != _PREAMBLE.size or preamble[:len(MAGIC)] != MAGIC:
+        raise ValueError(f'{path} is not a snapshot file')
+    _, header_offset, header_length = _PREAMBLE.unpack(preamble)
+    if not header_offset:
+        raise ValueError(f'Snapshot {path} is incomplete')
+    header = json.loads(_read_section(path, {'offset': header_offset, 'length': header_length}, verify=False))
+    if header.get('version') != SNAPSHOT_VERSION:
+        raise ValueError(f'Snapshot {path} has unsupported version {header.get("version")}')
+
+    section = header['vectors']
+    count, dimension = section['shape']
+    if section['length'] != count * dimension * 4:
+        raise ValueError(f'Snapshot {path} is truncated or corrupt')
+    vectors = np.memmap(path, dtype=section['dtype'], mode='r', offset=section['offset'], shape=(count, dimension)) \
+        if count else np.empty((0, dimension), dtype=np.float32)
+    if verify and zlib.crc32(vectors) != section['crc32']:
+        raise ValueError(f'Snapshot {path} is truncated or corrupt')
+
+    raw_ids = _read_section(path, header['ids'], verify)
+    ids = [str(uuid.UUID(bytes=raw_ids[i:i + 16])) for i in range(0, len(raw_ids), 16)]
+    payloads = [json.loads(line) for line in zlib.decompress(_read_section(path, header['payloads'], verify)).splitlines()]
+    if len(ids) != count or len(payloads) != count:
+        raise ValueError(f'Snapshot {path} is truncated or corrupt')
+
+    projection = None
+    if header.get('projection'):
+        section = header['projection']
+        components = np.frombuffer(_read_section(path, section, verify), dtype=section['dtype']).reshape(section['shape'])
+        projection = PCAProjection(components, section['model_name'], section['explained_variance_ratio'])
+    manifest = None
+    if header.get('manifest'):
+        manifest = json.loads(zlib.decompress(_read_section(path, header['manifest'], verify)))
+    return SimpleNamespace(header=header, vectors=vectors, ids=ids, payloads=payloads, projection=projection,
+                           manifest=manifest)
+
+
+def import_snapshot(path: str, replace: bool = False):
+    """
+    Load a snapshot file into the configured collection and backend.
+
+    Points are bulk-loaded from the memory-mapped matrix in UPSERT_BATCH_SIZE batches, concurrently against a Qdrant
+    server. Texts go to the text store when TEXT_STORE is set and stay in the payloads otherwise. The snapshot's PCA
+    projection and ingestion manifest are installed, so queries are projected like the stored vectors and a later
+    ingestion of the same files skips them; with ROUTING_CENTROIDS, the per-source centroids are recomputed.
+
+    Args:
+        path (str): Snapshot file written by export_snapshot.
+        replace (bool, optional): Drop the existing collection (and its centroids) first. Defaults to False.
+
+    Returns:
+        dict: The snapshot path, number of points, upsert statistics and seconds taken.
+
+    Raises:
+        ValueError: If the snapshot is invalid, was built with another embedding model or dimension, or the
+            collection already holds points and replace is False.
+    """
+    try:
+        start = time.perf_counter()
+        snapshot = open_snapshot(path)
+        header = snapshot.header
+        if header['embedding_model'] != EMBEDDING_MODEL:
+            raise ValueError(f'Snapshot {path} was built with {header["embedding_model"]}, not {EMBEDDING_MODEL}')
+        if header['dimension'] != get_index_dimension():
+            raise ValueError(f'Snapshot {path} holds {header["dimension"]}-d vectors but {get_index_dimension()} are '
+                             f'configured (VECTOR_DIMENSION/PCA_DIM)')
+
+        client, collection = get_qdrant_client()
+        text_store = get_text_store()
+        if client.count(collection_name=collection, exact=True).count:
+            if not replace:
+                raise ValueError(f'Collection {collection} is not empty; import with replace to overwrite it')
+            logger.info(f'Dropping collection {collection} before import')
+            client.delete_collection(collection_name=collection)
+            if client.collection_exists(centroid_collection_name(collection)):
+                client.delete_collection(collection_name=centroid_collection_name(collection))
+            if text_store is not None:
+                text_store.delete(list(text_store.entries))
+            reset_qdrant_client()
+            client, collection = get_qdrant_client()
+
+        if snapshot.projection is not None:
+            set_projection(snapshot.projection)
+        centroids = CentroidAccumulator() if ROUTING_CENTROIDS else None
+        upserter = BatchUpserter(client, collection, workers=UPSERT_WORKERS if supports_concurrent_upserts() else 1)
+        futures = []
+        try:
+            for begin in range(0, len(snapshot.ids), _IMPORT_STEP):
+                end = begin + _IMPORT_STEP
+                ids = snapshot.ids[begin:end]
+                vectors = np.ascontiguousarray(snapshot.vectors[begin:end], dtype=np.float32)
+                payloads = snapshot.payloads[begin:end]
+                if text_store is not None:
+                    payloads = [dict(payload) for payload in payloads]
+                    # Texts go first so a point is never visible without its text
+                    text_store.put_many((point_id, payload.pop('text')) for point_id, payload in zip(ids, payloads)
+                                        if 'text' in payload)
+                if centroids is not None:
+                    centroids.add([payload.get('source') for payload in payloads], vectors)
+                futures.extend(upserter.submit(ids, vectors, payloads))
+            for future in futures:
+                future.result()
+        finally:
+            upserter.close()
+
+        if centroids is not None:
+            ensure_centroid_collection(client, collection, header['dimension'])
+            upsert_centroids(client, collection, {
+                source: centroids.pop(source) for source in list(centroids.sums) if source is not None
+            })
+        if snapshot.manifest is not None:
+            manifest = IngestManifest(INGEST_MANIFEST_PATH)
+            # Texts and centroids were materialized for this node's settings, so record those
+            params = {key: value for key, value in snapshot.manifest['params'].items()
+                      if key not in ('text_store', 'centroids')}
+            if TEXT_STORE:
+                params['text_store'] = True
+            if ROUTING_CENTROIDS:
+                params['centroids'] = True
+            manifest.reset(params)
+            manifest.files = snapshot.manifest['files']
+            manifest.save()
+
+        seconds = time.perf_counter() - start
+        stats = upserter.stats()
+        logger.info(f'Imported {len(snapshot.ids)} points from {path} into {collection} in {seconds:.2f}s '
+                    f'({stats["points_per_second"]:.1f} points/sec)')
+        return {'path': str(path), 'points': len(snapshot.ids), 'upsert': stats, 'seconds': round(seconds, 2)}
+    except Exception as e:
+        logger.error(f'Snapshot import from {path} failed: {str(e)}')
+        raise
@@ -0,0 +1,123 @@
+# ingestion/upserter.py
+# Batched, retried and (against a Qdrant server) concurrent upserts of embedded points
+
+from concurrent.futures import Future, ThreadPoolExecutor
+import logging
+import threading
+import time
+from config import UPSERT_BATCH_SIZE, UPSERT_WORKERS, UPSERT_RETRIES, UPSERT_RETRY_BACKOFF
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class BatchUpserter:
+    """
+    Split upserts into batches of batch_size points and send them with retries.
+
+    With workers > 1 the batches are sent by a thread pool with wait=False, so the server acknowledges a batch
+    once it is in its write-ahead log and later operations on the collection are still applied after it. At most
+    two batches per worker are in flight; submit() blocks beyond that, so a slow server throttles ingestion instead
+    of letting batches pile up in memory. With one worker, batches are sent synchronously in the calling thread
+    with wait=True, which is what in-process stores (embedded Qdrant, the NumPy store) need.
+
+    Upserts are idempotent because point IDs are stable, so a failed batch is simply sent again, up to retries
+    times, waiting backoff seconds before the first retry and twice as long before each further one.
+
+    Args:
+        client: Vector store client.
+        collection (str): Collection to upsert into.
+        batch_size (int, optional): Points per upsert request. Defaults to UPSERT_BATCH_SIZE.
+        workers (int, optional): Concurrent upsert requests. Defaults to UPSERT_WORKERS.
+        retries (int, optional): Retries of a failed request. Defaults to UPSERT_RETRIES.
+        backoff (float, optional): Seconds before the first retry. Defaults to UPSERT_RETRY_BACKOFF.
+    """
+
+    def __init__(self, client, collection: str, batch_size: int = None, workers: int = None, retries: int = None,
+                 backoff: float = None):
+        self.client = client
+        self.collection = collection
+        self.batch_size = batch_size or UPSERT_BATCH_SIZE
+        self.workers = workers or UPSERT_WORKERS
+        self.retries = UPSERT_RETRIES if retries is None else retries
+        self.backoff = UPSERT_RETRY_BACKOFF if backoff is None else backoff
+        self.wait = self.workers == 1
+        self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix='upsert') if self.workers > 1 else None
+        self._slots = threading.BoundedSemaphore(2 * self.workers)
+        self._stats_lock = threading.Lock()
+        self.points = 0
+        self.batches = 0
+        self.retried = 0
+        self._started = None
+        self._finished = None
+
+    def submit(self, ids, vectors, payloads):
+        '''
+        Upsert points given as IDs, a float32 (n, dimension) array and payloads, in batches.
+
+        Returns one future per batch; a future holds the batch's exception once its retries are exhausted.
+        '''
+        if self._started is None:
+            self._started = time.perf_counter()
+        futures = []
+        for start in range(0, len(ids), self.batch_size):
+            end = start + self.batch_size
+            batch = (ids[start:end], vectors[start:end], payloads[start:end])
+            if self._executor is None:
+                future = Future()
+                try:
+                    future.set_result(self._send(*batch))
+                except Exception as e:
+                    future.set_exception(e)
+            else:
+                self._slots.acquire()
+                future = self._executor.submit(self._send, *batch)
+                future.add_done_callback(lambda _: self._slots.release())
+            futures.append(future)
+        return futures
+
+    def _send(self, ids, vectors, payloads):
+        for attempt in range(self.retries + 1):
+            try:
+                self.client.upload_collection(
+                    collection_name=self.collection,
+                    vectors=vectors,
+                    payload=payloads,
+                    ids=ids,
+                    batch_size=len(ids),
+                    max_retries=1,  # Retries are ours, so they are counted and backed off
+                    wait=self.wait,
+                )
+                break
+            except Exception as e:
+                if attempt == self.retries:
+                    logger.error(f'Upsert of {len(ids)} points failed after {attempt + 1} attempts: {str(e)}')
+                    raise
+                delay = self.backoff * 2 ** attempt
+                logger.warning(f'Upsert of {len(ids)} points failed ({str(e)}), retrying in {delay:.1f}s')
+                with self._stats_lock:
+                    self.retried += 1
+                time.sleep(delay)
+        with self._stats_lock:
+            self.points += len(ids)
+            self.batches += 1
+            self._finished = time.perf_counter()
+        return len(ids)
+
+    def stats(self):
+        '''Return the points and batches upserted, the retries, and points per second from first submit to last ack.'''
+        with self._stats_lock:
+            seconds = self._finished - self._started if self._finished is not None else 0.0
+            return {
+                'points': self.points,
+                'batches': self.batches,
+                'retries': self.retried,
+                'points_per_second': round(self.points / seconds, 1) if seconds > 0 else 0.0,
+            }
+
+    def close(self):
+        '''Wait for the batches in flight and stop the worker threads.'''
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
@@ -0,0 +1,73 @@
+# ingestion/watch.py
+# Polling watcher that keeps the index in sync with the PDF directories
+
+from pathlib import Path
+import logging
+import threading
+from ingestion.ingest import ingest_pdfs
+from config import ALLOWED_DIRECTORIES, INGEST_WATCH_INTERVAL, INGEST_WATCH_WINDOW
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def snapshot_directory(directory: str):
+    '''Return a frozenset of (path, size, mtime_ns) for the PDFs under directory.'''
+    entries = set()
+    for path in Path(directory).glob('**/[!.]*.pdf'):
+        try:
+            stat = path.stat()
+        except OSError:
+            continue  # Deleted between listing and stat
+        entries.add((str(path), stat.st_size, stat.st_mtime_ns))
+    return frozenset(entries)
+
+
+def watch_directories(directories=None, interval: float = None, chunk_size: int = 500, chunk_overlap: int = 100,
+                      client=None, stop_event=None, **ingest_kwargs):
+    """
+    Poll directories and incrementally ingest new, modified and deleted PDFs until stop_event is set.
+
+    Each poll only lists the directories and stats their PDFs. A directory is handed to ingest_pdfs once its
+    snapshot has changed since the last ingestion and stayed the same for one full interval, so files that are
+    still being copied are not picked up half-written. ingest_pdfs then processes only the delta via its manifest,
+    upserting in small windows so new documents become searchable as soon as their first chunks are embedded.
+
+    Args:
+        directories (iterable of str, optional): Directories to watch. Defaults to ALLOWED_DIRECTORIES.
+        interval (float, optional): Seconds between polls. Defaults to INGEST_WATCH_INTERVAL.
+        chunk_size (int, optional): Number of characters per text chunk. Defaults to 500.
+        chunk_overlap (int, optional): Number of overlapping characters between chunks. Defaults to 100.
+        client (optional): Existing Qdrant client instance. Pass a custom client for testing or specific configurations.
+        stop_event (threading.Event, optional): Set to stop watching. Defaults to watching until interrupted.
+        **ingest_kwargs: Extra keyword arguments passed to ingest_pdfs (e.g. workers, batch_size).
+    """
+    directories = sorted(directories or ALLOWED_DIRECTORIES)
+    interval = interval or INGEST_WATCH_INTERVAL
+    stop_event = stop_event or threading.Event()
+    ingest_kwargs.setdefault('window', INGEST_WATCH_WINDOW)
+    ingest_kwargs['incremental'] = True
+
+    last_seen = {}
+    last_ingested = {}
+    logger.info(f'Watching {directories} every {interval}s')
+    while not stop_event.is_set():
+        for directory in directories:
+            if not Path(directory).is_dir():
+                continue
+            snapshot = snapshot_directory(directory)
+            settled = snapshot == last_seen.get(directory)
+            last_seen[directory] = snapshot
+            if not settled or snapshot == last_ingested.get(directory):
+                continue
+            try:
+                result = ingest_pdfs(directory, chunk_size, chunk_overlap, client=client, **ingest_kwargs)
+                last_ingested[directory] = snapshot
+                if result['chunks_added'] or result['files_removed']:
+                    logger.info(f'Synced {directory}: {result}')
+            except Exception as e:
+                # Keep watching; the directory is retried on the next poll
+                logger.error(f'Watch ingestion failed for {directory}: {str(e)}')
+        stop_event.wait(interval)
+    logger.info('Stopped watching')
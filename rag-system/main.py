@@ -2,27 +2,47 @@
 # Entry point to run ingestion, retrieval, and generation
 
 from ingestion.ingest import ingest_pdfs
+from ingestion.snapshot import export_snapshot, import_snapshot
+from ingestion.watch import watch_directories
 from retrieval.retrieve import query_chunks
 from generation.generate import generate_response
 from utils.qdrant_utils import reset_qdrant_client
+from utils.text_store import reset_text_store
 import argparse
 import logging
+import sys
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def main(directory: str, query: str, chunk_size: int = 500, chunk_overlap: int = 100, top_k: int = 5):
+
+def parse_filters(items):
+    '''Parse repeated --filter key=value arguments into a filters dict; integers are converted and a,b matches either.'''
+    filters = {}
+    for item in items or ():
+        key, sep, value = item.partition('=')
+        if not sep or not key:
+            raise ValueError(f'Invalid filter {item!r}, expected key=value')
+        values = [int(v) if v.lstrip('-').isdigit() else v for v in value.split(',')]
+        filters[key] = values if len(values) > 1 else values[0]
+    return filters
+
+
+def main(directory: str, query: str, chunk_size: int = 500, chunk_overlap: int = 100, top_k: int = 5, batch_size: int = None,
+         incremental: bool = None, workers: int = None, chunk_unit: str = None, ef: int = None, exact: bool = False,
+         filters: dict = None):
     '''Run the full pipeline: ingest PDFs, query, and generate response.'''
     try:
         # Ingest PDFs
         logger.info(f'Starting ingestion for directory: {directory}')
-        ingest_result = ingest_pdfs(directory, chunk_size, chunk_overlap)
+        ingest_result = ingest_pdfs(directory, chunk_size, chunk_overlap, batch_size=batch_size, incremental=incremental,
+                                    workers=workers, chunk_unit=chunk_unit)
         logger.info(f'Ingestion complete: {ingest_result}')
 
         # Query Qdrant
         logger.info(f'Querying with text: {query}')
-        query_result = query_chunks(query, top_k)
+        query_result = query_chunks(query, top_k, ef=ef, exact=exact, filters=filters)
         contexts = [result['text'] for result in query_result['results']]
         logger.info(f'Retrieved {len(contexts)} chunks')
 
@@ -41,13 +61,86 @@ def main(directory: str, query: str, chunk_size: int = 500, chunk_overlap: int =
         raise
     finally:
         reset_qdrant_client()  # Ensure client is closed on exit
+        reset_text_store()
 
-if __name__ == '__main__':
-    parser = argparse.ArgumentParser(description='Run RAG pipeline')
-    parser.add_argument('--directory', type=str, required=True, help='Directory containing PDFs')
-    parser.add_argument('--query', type=str, required=True, help='Query text')
+
+def ingest(directory: str = None, watch: bool = False, chunk_size: int = 500, chunk_overlap: int = 100, **ingest_kwargs):
+    '''Ingest a directory once, or watch directories (default: ALLOWED_DIRECTORIES) and ingest changes as they appear.'''
+    try:
+        if watch:
+            try:
+                watch_directories([directory] if directory else None, chunk_size=chunk_size, chunk_overlap=chunk_overlap,
+                                  **ingest_kwargs)
+            except KeyboardInterrupt:
+                logger.info('Watch interrupted')
+            return None
+        if not directory:
+            raise ValueError('--directory is required unless --watch is given')
+        result = ingest_pdfs(directory, chunk_size, chunk_overlap, **ingest_kwargs)
+        logger.info(f'Ingestion complete: {result}')
+        return result
+    finally:
+        reset_qdrant_client()
+        reset_text_store()
+
+
+def snapshot(action: str, path: str, replace: bool = False):
+    '''Export the collection to a snapshot file, or import one into it.'''
+    try:
+        result = export_snapshot(path) if action == 'export' else import_snapshot(path, replace=replace)
+        logger.info(f'Snapshot {action} complete: {result}')
+        return result
+    finally:
+        reset_qdrant_client()
+        reset_text_store()
+
+
+def add_ingest_arguments(parser):
+    '''Add the chunking and ingestion options shared by the run and ingest commands.'''
     parser.add_argument('--chunk-size', type=int, default=500, help='Size of text chunks')
     parser.add_argument('--chunk-overlap', type=int, default=100, help='Overlap between chunks')
-    parser.add_argument('--top-k', type=int, default=5, help='Number of results to retrieve')
-    args = parser.parse_args()
-    main(args.directory, args.query, args.chunk_size, args.chunk_overlap, args.top_k)
\ No newline at end of file
+    parser.add_argument('--chunk-unit', choices=['chars', 'tokens'], default=None, help='Unit of chunk size and overlap (defaults to CHUNK_UNIT)')
+    parser.add_argument('--batch-size', type=int, default=None, help='Chunks per embedding batch (defaults to EMBEDDING_BATCH_SIZE)')
+    parser.add_argument('--full-reingest', action='store_true', help='Re-ingest every PDF even if unchanged since the last run')
+    parser.add_argument('--workers', type=int, default=None, help='Processes used to parse and chunk PDFs (defaults to INGEST_WORKERS)')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run RAG pipeline')
+    subparsers = parser.add_subparsers(dest='command')
+
+    run_parser = subparsers.add_parser('run', help='Ingest a directory, query it and generate a response (default)')
+    run_parser.add_argument('--directory', type=str, required=True, help='Directory containing PDFs')
+    run_parser.add_argument('--query', type=str, required=True, help='Query text')
+    run_parser.add_argument('--top-k', type=int, default=5, help='Number of results to retrieve')
+    run_parser.add_argument('--ef', type=int, default=None, help='HNSW search candidate list size (defaults to HNSW_EF)')
+    run_parser.add_argument('--exact', action='store_true', help='Search exhaustively instead of through the HNSW index')
+    run_parser.add_argument('--filter', action='append', default=[], metavar='KEY=VALUE',
+                            help='Only retrieve chunks whose payload matches, e.g. source=/app/data/a.pdf or page=1,2 (repeatable)')
+    add_ingest_arguments(run_parser)
+
+    ingest_parser = subparsers.add_parser('ingest', help='Ingest PDFs without querying')
+    ingest_parser.add_argument('--directory', type=str, default=None, help='Directory containing PDFs (defaults to ALLOWED_DIRECTORIES with --watch)')
+    ingest_parser.add_argument('--watch', action='store_true', help='Keep running and ingest new, modified and deleted PDFs')
+    add_ingest_arguments(ingest_parser)
+
+    snapshot_parser = subparsers.add_parser('snapshot', help='Export the collection to a snapshot file or import one')
+    snapshot_parser.add_argument('action', choices=['export', 'import'], help='Write or load the snapshot')
+    snapshot_parser.add_argument('path', type=str, help='Snapshot file')
+    snapshot_parser.add_argument('--replace', action='store_true', help='On import, drop the points already in the collection')
+
+    # Without a command, behave like the original single-command CLI
+    argv = sys.argv[1:]
+    if not argv or argv[0] not in (*subparsers.choices, '-h', '--help'):
+        argv = ['run'] + argv
+    args = parser.parse_args(argv)
+
+    if args.command == 'snapshot':
+        snapshot(args.action, args.path, args.replace)
+    elif args.command == 'ingest':
+        ingest(args.directory, args.watch, args.chunk_size, args.chunk_overlap, batch_size=args.batch_size,
+               incremental=False if args.full_reingest else None, workers=args.workers, chunk_unit=args.chunk_unit)
+    else:
+        main(args.directory, args.query, args.chunk_size, args.chunk_overlap, args.top_k, args.batch_size,
+             incremental=False if args.full_reingest else None, workers=args.workers, chunk_unit=args.chunk_unit,
+             ef=args.ef, exact=args.exact, filters=parse_filters(args.filter))
@@ -0,0 +1,95 @@
+# retrieval/query_cache.py
+# In-memory LRU cache of query embeddings with optional TTL
+
+from collections import OrderedDict
+import logging
+import threading
+import time
+from utils.embedding_cache import normalize_text
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class QueryCache:
+    """
+    Thread-safe LRU mapping of normalized query text to its query vector.
+
+    Entries are tagged with the identity of the model that produced them (see get_model_identity in
+    utils.embeddings); the first lookup under a different identity empties the cache, so a model change or
+    reset never serves vectors from the previous model. Cached vectors are made read-only because they are
+    shared between callers.
+
+    Args:
+        max_entries (int): Maximum number of cached queries; the least recently used one is evicted first.
+        ttl_seconds (float, optional): Lifetime of an entry in seconds; 0 keeps entries until evicted. Defaults to 0.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float = 0):
+        if max_entries <= 0:
+            raise ValueError('max_entries must be positive')
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._identity = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _check_identity(self, identity):
+        if identity != self._identity:
+            if self._entries:
+                logger.info('Embedding model changed, clearing query cache')
+                self.invalidations += 1
+            self._entries.clear()
+            self._identity = identity
+
+    def get(self, identity, text: str):
+        '''Return the cached vector for text under the given model identity, or None.'''
+        key = normalize_text(text)
+        with self._lock:
+            self._check_identity(identity)
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl_seconds and time.monotonic() - entry[1] > self.ttl_seconds:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, identity, text: str, vector):
+        '''Cache vector for text under the given model identity and return the (read-only) cached vector.'''
+        key = normalize_text(text)
+        vector.flags.writeable = False
+        with self._lock:
+            self._check_identity(identity)
+            self._entries[key] = (vector, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return vector
+
+    def clear(self):
+        '''Drop every entry, keeping the counters.'''
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        '''Return hit/miss counters, the hit rate, evictions, invalidations and the current size.'''
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'size': len(self._entries),
+            }
@@ -1,9 +1,15 @@
 # retrieval/retrieve.py
 # Module for querying Qdrant to retrieve relevant text chunks
 
-from utils.embeddings import embed_text
-from utils.qdrant_utils import get_qdrant_client
+from retrieval.query_cache import QueryCache
+from utils.embeddings import embed_array, get_model_identity
+from utils.projection import get_projection
+from utils.qdrant_utils import build_filter, get_qdrant_client, get_search_params
+from utils.routing import route_sources
+from utils.text_store import get_text_store
+from config import QUERY_CACHE_SIZE, QUERY_CACHE_TTL, PCA_DIM, ROUTING_NPROBE
 import logging
+import threading
 from datetime import datetime
 
 # Configure logging
@@ -16,16 +22,67 @@ file_handler.setLevel(logging.INFO)
 file_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
 logger.addHandler(file_handler)
 
+# Query embedding cache, created on first use
+_query_cache = None
+_query_cache_lock = threading.Lock()
 
-def query_chunks(query_text: str, top_k: int = 5, client=None, model=None):
+
+def get_query_cache():
+    '''Return the shared query embedding cache, or None if QUERY_CACHE_SIZE is 0.'''
+    global _query_cache
+    if QUERY_CACHE_SIZE <= 0:
+        return None
+    with _query_cache_lock:
+        if _query_cache is None:
+            _query_cache = QueryCache(QUERY_CACHE_SIZE, QUERY_CACHE_TTL)
+    return _query_cache
+
+
+def get_query_cache_stats():
+    '''Return query cache hit rate and counters, or None if the cache is disabled.'''
+    cache = get_query_cache()
+    return cache.stats() if cache is not None else None
+
+
+def embed_query(query_text: str, model=None):
+    '''
+    Embed a query, serving repeated queries from the query cache.
+
+    Only the shared model is cached; an injected model always encodes.
+    '''
+    cache = get_query_cache() if model is None else None
+    if cache is None:
+        return embed_array(query_text, model)
+    identity = get_model_identity()
+    query_vector = cache.get(identity, query_text)
+    if query_vector is None:
+        query_vector = cache.put(identity, query_text, embed_array(query_text))
+    return query_vector
+
+
+def query_chunks(query_text: str, top_k: int = 5, client=None, model=None, rescore: bool = None, oversampling: float = None,
+                 ef: int = None, exact: bool = False, filters: dict = None, nprobe: int = None):
     """
     Retrieve the top_k most relevant text chunks from a Qdrant collection based on a query string.
 
+    Query vectors are kept in an in-memory LRU (QUERY_CACHE_SIZE, QUERY_CACHE_TTL) keyed by normalized query text,
+    so repeated questions skip the embedding model. With PCA_DIM set, the query vector is reduced with the
+    collection's PCA projection before searching. Texts kept in the text store (TEXT_STORE) are read for the final
+    hits only.
+
     Args:
         query_text (str): The input query string to search for relevant chunks.
         top_k (int, optional): The number of top relevant chunks to retrieve. Defaults to 5.
         client (optional): An existing Qdrant client instance. Pass a custom client for testing or specific configurations.
         model (optional): The embedding model to use for encoding the query text. Pass a custom model for testing or specific configurations.
+        rescore (bool, optional): With QDRANT_QUANTIZATION, re-rank candidates with the original vectors. Defaults to QDRANT_SEARCH_RESCORE.
+        oversampling (float, optional): With QDRANT_QUANTIZATION, candidates fetched per result before rescoring. Defaults to QDRANT_SEARCH_OVERSAMPLING.
+        ef (int, optional): HNSW candidate list size; higher trades latency for recall. Defaults to HNSW_EF.
+        exact (bool, optional): Search exhaustively instead of through the HNSW index. Defaults to False.
+        filters (dict, optional): Payload conditions every result must meet, e.g. {'source': path, 'page': 3}. A list
+            value matches any of its items and a dict of gt/gte/lt/lte bounds matches a range (e.g. on 'mtime').
+        nprobe (int, optional): Route the query to the nprobe source PDFs with the most similar centroids (built with
+            ROUTING_CENTROIDS) and search only their chunks; 0 searches every chunk. Defaults to ROUTING_NPROBE.
 
     Returns:
         dict: A dictionary with a single key 'results', containing a list of dictionaries for each retrieved chunk.
@@ -41,16 +98,38 @@ def query_chunks(query_text: str, top_k: int = 5, client=None, model=None):
 
     try:
         client, collection = get_qdrant_client(client)
-        logger.info(f'Querying with text: {query_text}, top_k: {top_k}')
-        query_vector = embed_text(query_text, model)
+        logger.info(f'Querying with text: {query_text}, top_k: {top_k}' + (f', filters: {filters}' if filters else ''))
+        query_vector = embed_query(query_text, model)
+        if PCA_DIM:
+            projection = get_projection()
+            if projection is None:
+                raise ValueError('No PCA projection has been fitted for this collection yet; ingest documents first')
+            query_vector = projection.transform(query_vector)
+        nprobe = ROUTING_NPROBE if nprobe is None else nprobe
+        if nprobe > 0:
+            sources = route_sources(client, collection, query_vector, nprobe, (filters or {}).get('source'))
+            if sources:
+                logger.info(f'Routed query to {len(sources)} sources')
+                filters = {**(filters or {}), 'source': sources}
         results = client.query_points(
             collection_name=collection,
             query=query_vector,
-            limit=top_k
+            limit=top_k,
+            query_filter=build_filter(filters),
+            search_params=get_search_params(rescore, oversampling, ef, exact),
         ).points
+        # Texts kept in the text store are only fetched for the hits
+        missing = [point.id for point in results if 'text' not in point.payload]
+        text_store = get_text_store() if missing else None
+        texts = text_store.get_many(missing) if text_store is not None else {}
+        unresolved = [point_id for point_id in missing if point_id not in texts]
+        if unresolved:
+            raise ValueError(f'{len(unresolved)} hits have no text in their payload and none in the text store '
+                             f'(TEXT_STORE={"on" if text_store is not None else "off"}); the text store must be '
+                             f'enabled and shared with the ingesting node')
         response = [
             {
-                'text': point.payload['text'],
+                'text': point.payload['text'] if 'text' in point.payload else texts[point.id],
                 'source': point.payload['source'],
                 'chunk_id': point.payload['chunk_id'],
                 'score': point.score
@@ -0,0 +1,104 @@
+# tests/test_ingest.py
+# Regression tests for incremental ingestion against the NumPy vector store
+
+from types import SimpleNamespace
+import hashlib
+import numpy as np
+import pytest
+from qdrant_client.models import Distance, VectorParams
+import ingestion.ingest as ingest
+from ingestion.manifest import IngestManifest
+from utils.numpy_store import NumpyVectorStore
+from config import QDRANT_COLLECTION
+
+DIMENSION = 8
+
+
+def fake_embed_chunks(chunks, batch_size=None, pool=None):
+    '''Deterministic unit vectors derived from the chunk texts, so no model is needed.'''
+    vectors = np.array([
+        np.frombuffer(hashlib.sha256(chunk.text.encode('utf-8')).digest()[:DIMENSION * 4], dtype=np.uint32)
+        for chunk in chunks
+    ], dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def fake_pdf_pages(path):
+    '''Treat each "PDF" as a plain-text file with one page.'''
+    yield SimpleNamespace(page_content=path.read_text(), metadata={'source': str(path), 'page': 0})
+
+
+@pytest.fixture
+def env(tmp_path, monkeypatch):
+    docs = tmp_path / 'docs'
+    docs.mkdir()
+    monkeypatch.setattr(ingest, 'ALLOWED_DIRECTORIES', {str(docs.resolve())})
+    monkeypatch.setattr(ingest, 'iter_pdf_pages', fake_pdf_pages)
+    monkeypatch.setattr(ingest, 'embed_chunks', fake_embed_chunks)
+    monkeypatch.setattr(ingest, 'get_token_counter', lambda: None)
+    monkeypatch.setattr(ingest, 'get_max_input_tokens', lambda: None)
+    monkeypatch.setattr(ingest, 'get_text_store', lambda: None)
+    monkeypatch.setattr(ingest, 'get_projection', lambda: None)
+    monkeypatch.setattr(ingest, 'PCA_DIM', 0)
+    monkeypatch.setattr(ingest, 'ROUTING_CENTROIDS', False)
+    client = NumpyVectorStore(str(tmp_path / 'store'))
+    client.create_collection(QDRANT_COLLECTION, vectors_config=VectorParams(size=DIMENSION, distance=Distance.COSINE))
+    manifest_path = str(tmp_path / 'manifest.json')
+
+    def run(chunk_size):
+        return ingest.ingest_pdfs(str(docs), chunk_size=chunk_size, chunk_overlap=0, client=client,
+                                  manifest_path=manifest_path, chunk_unit='chars')
+
+    yield SimpleNamespace(docs=docs, client=client, manifest_path=manifest_path, run=run)
+    client.close()
+
+
+def stored_chunk_ids(client):
+    records, _ = client.scroll(QDRANT_COLLECTION, limit=10000)
+    return sorted(record.payload['chunk_id'] for record in records)
+
+
+def test_changed_chunk_settings_replace_old_points(env):
+    (env.docs / 'a.pdf').write_text(' '.join(f'word{i}' for i in range(400)))
+    first = env.run(chunk_size=200)
+    assert first['chunks_added'] > 5
+
+    second = env.run(chunk_size=1000)
+    manifest = IngestManifest(env.manifest_path)
+    expected = sorted(
+        chunk_id for entry in manifest.files.values() for chunk_id in
+        (record.payload['chunk_id'] for record in env.client.retrieve(QDRANT_COLLECTION, entry['point_ids']))
+    )
+    assert second['chunks_added'] < first['chunks_added']
+    assert stored_chunk_ids(env.client) == expected
+    assert len(expected) == second['chunks_added']
+
+
+def test_changed_settings_keep_entries_of_other_directories(env, tmp_path, monkeypatch):
+    other = tmp_path / 'other'
+    other.mkdir()
+    (other / 'b.pdf').write_text(' '.join(f'term{i}' for i in range(100)))
+    (env.docs / 'a.pdf').write_text(' '.join(f'word{i}' for i in range(100)))
+    monkeypatch.setattr(ingest, 'ALLOWED_DIRECTORIES', {str(env.docs.resolve()), str(other.resolve())})
+    ingest.ingest_pdfs(str(other), chunk_size=200, chunk_overlap=0, client=env.client,
+                       manifest_path=env.manifest_path, chunk_unit='chars')
+    env.run(chunk_size=200)
+
+    # New settings for docs only, then b.pdf disappears: its points must still be deleted
+    env.run(chunk_size=1000)
+    (other / 'b.pdf').unlink()
+    result = ingest.ingest_pdfs(str(other), chunk_size=1000, chunk_overlap=0, client=env.client,
+                                manifest_path=env.manifest_path, chunk_unit='chars')
+    assert result['files_removed'] == 1
+    assert all(chunk_id.startswith(str(env.docs.resolve())) for chunk_id in stored_chunk_ids(env.client))
+
+
+def test_removed_file_is_dropped_from_manifest(env):
+    (env.docs / 'a.pdf').write_text(' '.join(f'word{i}' for i in range(100)))
+    (env.docs / 'b.pdf').write_text(' '.join(f'term{i}' for i in range(100)))
+    env.run(chunk_size=200)
+    (env.docs / 'b.pdf').unlink()
+
+    assert env.run(chunk_size=200)['files_removed'] == 1
+    assert str((env.docs / 'b.pdf').resolve()) not in IngestManifest(env.manifest_path).files
+    assert env.run(chunk_size=200)['files_removed'] == 0
@@ -0,0 +1,111 @@
+# utils/batcher.py
+# Dynamic micro-batching of concurrent embedding requests
+
+from collections import Counter, deque
+from concurrent.futures import Future
+import logging
+import queue
+import threading
+import time
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Number of recent queueing delays kept for percentile reporting
+_DELAY_SAMPLES = 10000
+
+
+class EmbeddingBatcher:
+    """
+    Coalesces concurrent single-text embedding requests into one encode call.
+
+    Callers block in embed() while a background thread collects requests until max_batch_size texts are
+    waiting or max_wait_ms has passed since the first one arrived, runs encode_fn once on the whole batch
+    and hands each caller its own row.
+
+    Args:
+        encode_fn (callable): Function taking a list of texts and returning one vector per text.
+        max_wait_ms (float, optional): Longest time the first request of a batch waits for company. Defaults to 5.
+        max_batch_size (int, optional): Largest number of texts encoded together. Defaults to 32.
+    """
+
+    def __init__(self, encode_fn, max_wait_ms: float = 5, max_batch_size: int = 32):
+        self.encode_fn = encode_fn
+        self.max_wait = max_wait_ms / 1000
+        self.max_batch_size = max_batch_size
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._batch_sizes = Counter()
+        self._delays = deque(maxlen=_DELAY_SAMPLES)
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='embedding-batcher', daemon=True)
+        self._thread.start()
+
+    def embed(self, text: str):
+        '''Embed a single text, sharing the forward pass with concurrent callers.'''
+        if self._closed:
+            raise RuntimeError('EmbeddingBatcher is closed')
+        future = Future()
+        self._queue.put((text, future, time.perf_counter()))
+        return future.result()
+
+    def _collect(self):
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)  # Let the loop see the shutdown after this batch
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while (batch := self._collect()) is not None:
+            started = time.perf_counter()
+            with self._lock:
+                self._batch_sizes[len(batch)] += 1
+                self._delays.extend(started - enqueued for _, _, enqueued in batch)
+            try:
+                vectors = self.encode_fn([text for text, _, _ in batch])
+                for (_, future, _), vector in zip(batch, vectors):
+                    future.set_result(vector)
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+
+    def stats(self):
+        '''Return request/batch counts, the batch size distribution and queueing delay percentiles in ms.'''
+        with self._lock:
+            sizes = dict(sorted(self._batch_sizes.items()))
+            delays = sorted(self._delays)
+        batches = sum(sizes.values())
+        requests = sum(size * count for size, count in sizes.items())
+
+        def percentile(p):
+            return round(delays[min(len(delays) - 1, int(p * len(delays)))] * 1000, 3) if delays else 0.0
+
+        return {
+            'requests': requests,
+            'batches': batches,
+            'mean_batch_size': round(requests / batches, 2) if batches else 0.0,
+            'batch_size_distribution': sizes,
+            'queue_delay_ms': {'p50': percentile(0.5), 'p95': percentile(0.95), 'max': percentile(1.0)},
+        }
+
+    def close(self):
+        '''Stop the background thread after pending requests are served.'''
+        if not self._closed:
+            self._closed = True
+            self._queue.put(None)
+            self._thread.join()
@@ -0,0 +1,115 @@
+# utils/embedding_cache.py
+# Persistent SQLite cache of embeddings keyed by model name and normalized text hash
+
+from pathlib import Path
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+import unicodedata
+import numpy as np
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# SQLite limits the number of bound parameters per statement
+_SQL_BATCH = 500
+
+
+def normalize_text(text: str) -> str:
+    '''Normalize text for cache keys: Unicode NFC and collapsed whitespace.'''
+    return ' '.join(unicodedata.normalize('NFC', text).split())
+
+
+def cache_key(model_name: str, text: str) -> bytes:
+    '''Return the cache key for text embedded with model_name.'''
+    return hashlib.sha256(f'{model_name}\0{normalize_text(text)}'.encode('utf-8')).digest()
+
+
+class EmbeddingCache:
+    '''
+    Size-bounded on-disk embedding cache.
+
+    Vectors are stored as raw float32 blobs in a single SQLite table. Each row carries a last-used
+    timestamp; once the cache grows past max_entries the least recently used rows are evicted.
+    The cache is safe to share between threads and between processes using the same file.
+    '''
+
+    def __init__(self, path: str, max_entries: int = 1_000_000):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS embeddings (key BLOB PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)')
+        self._conn.commit()
+        self._size = self._conn.execute('SELECT COUNT(*) FROM embeddings').fetchone()[0]
+        logger.info(f'Opened embedding cache {path} with {self._size} entries')
+
+    def get_many(self, keys):
+        '''Return a dict of key -> float32 vector for the keys present in the cache.'''
+        found = {}
+        now = time.time()
+        with self._lock:
+            for start in range(0, len(keys), _SQL_BATCH):
+                batch = keys[start:start + _SQL_BATCH]
+                placeholders = ','.join('?' * len(batch))
+                rows = self._conn.execute(
+                    f'SELECT key, vector FROM embeddings WHERE key IN ({placeholders})', batch
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32)
+                if rows:
+                    self._conn.execute(
+                        f'UPDATE embeddings SET last_used = ? WHERE key IN ({",".join("?" * len(rows))})',
+                        [now] + [key for key, _ in rows],
+                    )
+            self._conn.commit()
+            self.hits += len(found)
+            self.misses += len(set(keys)) - len(found)
+        return found
+
+    def put_many(self, items):
+        '''Store (key, vector) pairs and evict the least recently used entries above max_entries.'''
+        now = time.time()
+        rows = [(key, np.asarray(vector, dtype=np.float32).tobytes(), now) for key, vector in items]
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.executemany('INSERT OR IGNORE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)', rows)
+            self._size += self._conn.total_changes - before
+            overflow = self._size - self.max_entries
+            if overflow > 0:
+                self._conn.execute(
+                    'DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_used LIMIT ?)',
+                    (overflow,),
+                )
+                self._size -= overflow
+                self.evictions += overflow
+            self._conn.commit()
+
+    def stats(self):
+        '''Return hit/miss counters and the current number of entries.'''
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': self._size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+    def close(self):
+        '''Close the underlying SQLite connection.'''
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,71 @@
+# utils/embedding_pool.py
+# Multi-process embedding pool for large ingestion runs
+
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+import logging
+import multiprocessing
+import numpy as np
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Model loaded once per worker process by _init_worker
+_worker_model = None
+
+
+def _init_worker(load_fn, threads: int):
+    '''Limit the worker's intra-op threads and load its own copy of the model.'''
+    global _worker_model
+    import torch
+    torch.set_num_threads(threads)
+    _worker_model = load_fn(threads=threads)
+
+
+def _encode_slice(texts, batch_size: int):
+    return np.asarray(_worker_model.encode(texts, batch_size=batch_size), dtype=np.float32)
+
+
+class EmbeddingPool:
+    """
+    Pool of worker processes that each hold a model copy and encode a slice of every request.
+
+    Workers are started with the 'spawn' method, so no torch or tokenizer state is inherited from the parent,
+    and load their model in the initializer so the first request does not pay for it. encode() has the same
+    signature as SentenceTransformer.encode for lists of texts: the list is split into one contiguous slice
+    per worker and the results are concatenated in input order.
+
+    Args:
+        load_fn (callable): Picklable module-level function taking threads= and returning a model with encode().
+        workers (int): Number of worker processes.
+        threads (int, optional): Intra-op threads per worker; 0 divides the CPU cores evenly. Defaults to 0.
+    """
+
+    def __init__(self, load_fn, workers: int, threads: int = 0):
+        if workers <= 0:
+            raise ValueError('workers must be positive')
+        self.workers = workers
+        self.threads = threads or max(1, (multiprocessing.cpu_count() or 1) // workers)
+        logger.info(f'Starting embedding pool with {workers} workers x {self.threads} threads')
+        self._executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(load_fn, self.threads),
+        )
+
+    def encode(self, sentences, batch_size: int = 32, **kwargs):
+        '''Embed a text or list of texts across the workers; extra keyword arguments are ignored.'''
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        slice_size = -(-len(texts) // self.workers)
+        slices = [texts[start:start + slice_size] for start in range(0, len(texts), slice_size)]
+        embeddings = np.concatenate(list(self._executor.map(_encode_slice, slices, repeat(batch_size))))
+        return embeddings[0] if single else embeddings
+
+    def close(self):
+        '''Shut the worker processes down.'''
+        self._executor.shutdown(wait=True, cancel_futures=True)
@@ -1,9 +1,21 @@
 # utils/embeddings.py
 # Shared utility for generating text embeddings
 
+from pathlib import Path
+from huggingface_hub import snapshot_download
 from sentence_transformers import SentenceTransformer
+from transformers import AutoTokenizer
+import json
 import logging
-from config import EMBEDDING_MODEL
+import threading
+import numpy as np
+from utils.embedding_cache import EmbeddingCache, cache_key
+from utils.batcher import EmbeddingBatcher
+from utils.embedding_pool import EmbeddingPool
+from utils.onnx_backend import OnnxSentenceEncoder, ensure_exported
+from config import EMBEDDING_MODEL, EMBEDDING_BATCH_SIZE, EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_MAX_ENTRIES, \
+    EMBEDDING_MICROBATCH, EMBEDDING_MICROBATCH_WAIT_MS, EMBEDDING_MICROBATCH_MAX_SIZE, EMBEDDING_BACKEND, \
+    ONNX_EXPORT_DIR, ONNX_THREADS, EMBEDDING_POOL_WORKERS, EMBEDDING_POOL_THREADS
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -11,11 +23,50 @@ logger = logging.getLogger(__name__)
 
 # Initialize global model
 _model = None
+_model_lock = threading.Lock()
+# Incremented by reset_model so holders of derived state (e.g. the query cache) can detect a new model
+_model_generation = 0
+
+# (tokenizer, max_seq_length) of EMBEDDING_MODEL, loaded without the model weights on first use
+_tokenizer = None
+_tokenizer_lock = threading.Lock()
+
+# Optional persistent embedding cache, opened on first use
+_cache = None
+_cache_lock = threading.Lock()
+
+# Optional micro-batcher for concurrent single-text requests, started on first use
+_batcher = None
+_batcher_lock = threading.Lock()
+
+# Optional multi-process encoding pool for large ingestion runs, started on first use
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def load_model(backend: str = None, threads: int = None):
+    '''
+    Load EMBEDDING_MODEL with the given backend.
+
+    Parameters:
+        backend (str, optional): 'torch' (SentenceTransformer), 'onnx' or 'onnx-int8' (ONNX Runtime, exported on first use). Defaults to EMBEDDING_BACKEND.
+        threads (int, optional): Intra-op threads of an ONNX Runtime session. Defaults to ONNX_THREADS.
+
+    Returns:
+        SentenceTransformer or OnnxSentenceEncoder: A model exposing encode(), tokenizer and max_seq_length.
+    '''
+    backend = backend or EMBEDDING_BACKEND
+    if backend == 'torch':
+        return SentenceTransformer(EMBEDDING_MODEL)
+    if backend in ('onnx', 'onnx-int8'):
+        return OnnxSentenceEncoder(EMBEDDING_MODEL, ONNX_EXPORT_DIR, quantized=backend == 'onnx-int8',
+                                    threads=ONNX_THREADS if threads is None else threads)
+    raise ValueError(f'Unknown embedding backend: {backend}')
 
 
 def get_model(model=None):
     '''
-    Get or initialize the SentenceTransformer model.
+    Get or initialize the embedding model for EMBEDDING_BACKEND.
 
     Parameters:
         model (SentenceTransformer, optional): If provided, this model instance will be used instead of loading a new one. Useful for dependency injection or testing.
@@ -26,40 +77,229 @@ def get_model(model=None):
     global _model
     if model is not None:
         return model  # Use injected model for testing
-    if _model is None:
-        try:
-            logger.info(f'Loading SentenceTransformer model: {EMBEDDING_MODEL}')
-            _model = SentenceTransformer(EMBEDDING_MODEL)
-        except Exception as e:
-            logger.error(f'Failed to load model: {str(e)}')
-            raise
-    return _model
+    with _model_lock:
+        if _model is None:
+            try:
+                logger.info(f'Loading embedding model: {EMBEDDING_MODEL} (backend: {EMBEDDING_BACKEND})')
+                _model = load_model()
+            except Exception as e:
+                logger.error(f'Failed to load model: {str(e)}')
+                raise
+        return _model
 
 
 def reset_model():
-    '''Reset the model to handle errors or updates.'''
-    global _model
+    '''Reset the model to handle errors or updates, shutting down the embedding pool if one is running.'''
+    global _model, _pool, _model_generation
     _model = None
+    _model_generation += 1
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
     logger.info('Model reset requested')
 
 
-def embed_text(text, model=None):
+def get_embedding_pool():
+    '''Return the shared multi-process EmbeddingPool, or None if EMBEDDING_POOL_WORKERS is 0.'''
+    global _pool
+    if EMBEDDING_POOL_WORKERS <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            if EMBEDDING_BACKEND in ('onnx', 'onnx-int8'):
+                # Export once here rather than racing to do it in every worker
+                ensure_exported(EMBEDDING_MODEL, ONNX_EXPORT_DIR, quantized=EMBEDDING_BACKEND == 'onnx-int8')
+            _pool = EmbeddingPool(load_model, EMBEDDING_POOL_WORKERS, EMBEDDING_POOL_THREADS)
+    return _pool
+
+
+def get_model_identity():
+    '''Return a value that changes whenever the shared model's vectors may change (model, backend or a reset).'''
+    return EMBEDDING_MODEL, EMBEDDING_BACKEND, _model_generation
+
+
+class TokenCounter:
+    '''Picklable length function returning the number of model tokens in a text, excluding special tokens.'''
+
+    def __init__(self, tokenizer):
+        self.tokenizer = tokenizer
+
+    def __call__(self, text: str) -> int:
+        return len(self.tokenizer(text, add_special_tokens=False, verbose=False)['input_ids'])
+
+    def count_many(self, texts):
+        '''Return the token count of each text, tokenizing them in one call.'''
+        return [len(ids) for ids in self.tokenizer(list(texts), add_special_tokens=False, verbose=False)['input_ids']]
+
+
+def _model_config_dir():
+    '''Return a local directory holding EMBEDDING_MODEL's configuration and tokenizer files, fetching only those.'''
+    if Path(EMBEDDING_MODEL).is_dir():
+        return Path(EMBEDDING_MODEL)
+    repo_id = EMBEDDING_MODEL if '/' in EMBEDDING_MODEL else f'sentence-transformers/{EMBEDDING_MODEL}'
+    return Path(snapshot_download(repo_id, allow_patterns=['*.json', '*.txt', '*.model']))
+
+
+def load_tokenizer():
     '''
-    Generate embeddings for text using SentenceTransformer.
+    Load EMBEDDING_MODEL's tokenizer and maximum sequence length without loading the model weights.
+
+    Returns:
+        tuple: (tokenizer, max_seq_length), as the SentenceTransformer would use them.
+    '''
+    root = _model_config_dir()
+    modules_path = root / 'modules.json'
+    modules = json.loads(modules_path.read_text(encoding='utf-8')) if modules_path.exists() else []
+    module_dir = root / next((module['path'] for module in modules if module['type'].endswith('Transformer')), '')
+    tokenizer = AutoTokenizer.from_pretrained(str(module_dir))
+    max_seq_length = tokenizer.model_max_length
+    for name, key in (('sentence_bert_config.json', 'max_seq_length'), ('config.json', 'max_position_embeddings')):
+        if (module_dir / name).exists():
+            limit = json.loads((module_dir / name).read_text(encoding='utf-8')).get(key)
+            if limit:
+                max_seq_length = limit if key == 'max_seq_length' else min(max_seq_length, limit)
+                break
+    return tokenizer, max_seq_length
+
+
+def get_tokenizer(model=None):
+    '''Return (tokenizer, max_seq_length) of the given or loaded model, else of EMBEDDING_MODEL without its weights.'''
+    global _tokenizer
+    model_instance = model if model is not None else _model
+    if model_instance is not None:
+        return model_instance.tokenizer, model_instance.max_seq_length
+    with _tokenizer_lock:
+        if _tokenizer is None:
+            logger.info(f'Loading tokenizer of {EMBEDDING_MODEL}')
+            _tokenizer = load_tokenizer()
+        return _tokenizer
+
+
+def get_token_counter(model=None):
+    '''Return a TokenCounter backed by the embedding model's tokenizer.'''
+    return TokenCounter(get_tokenizer(model)[0])
+
+
+def get_max_input_tokens(model=None):
+    '''Return how many content tokens the model embeds before truncating (max_seq_length minus special tokens).'''
+    tokenizer, max_seq_length = get_tokenizer(model)
+    return max_seq_length - tokenizer.num_special_tokens_to_add(pair=False)
+
+
+def get_embedding_cache():
+    '''Return the shared embedding cache, or None if EMBEDDING_CACHE_PATH is not set.'''
+    global _cache
+    if not EMBEDDING_CACHE_PATH:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = EmbeddingCache(EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_MAX_ENTRIES)
+    return _cache
+
+
+def get_cache_stats():
+    '''Return embedding cache hit/miss counters, or None if the cache is disabled.'''
+    cache = get_embedding_cache()
+    return cache.stats() if cache is not None else None
+
+
+def _encode_cached(model_instance, cache, text, batch_size):
+    '''Encode text through the embedding cache, running the model only for cache misses.'''
+    texts = [text] if isinstance(text, str) else list(text)
+    # Quantized or exported backends produce slightly different vectors, so they get their own keys
+    model_name = EMBEDDING_MODEL if EMBEDDING_BACKEND == 'torch' else f'{EMBEDDING_MODEL}@{EMBEDDING_BACKEND}'
+    keys = [cache_key(model_name, t) for t in texts]
+    cached = cache.get_many(keys)
+    missing = {}
+    for key, t in zip(keys, texts):
+        if key not in cached and key not in missing:
+            missing[key] = t
+    if missing:
+        vectors = model_instance.encode(list(missing.values()), batch_size=batch_size)
+        cache.put_many(zip(missing.keys(), vectors))
+        cached.update(zip(missing.keys(), vectors))
+    embeddings = np.stack([cached[key] for key in keys]) if keys else np.empty((0, 0), dtype=np.float32)
+    return embeddings[0] if isinstance(text, str) else embeddings
+
+
+def _encode(text, model=None, batch_size=None, pool=None):
+    '''Encode text (str or list) into a numpy array, using the embedding cache for the shared model.'''
+    model_instance = pool if pool is not None else get_model(model)
+    batch_size = batch_size or EMBEDDING_BATCH_SIZE
+    cache = get_embedding_cache() if model is None else None
+    if cache is not None:
+        return _encode_cached(model_instance, cache, text, batch_size)
+    return model_instance.encode(text, batch_size=batch_size)
+
+
+def get_batcher():
+    '''Return the shared EmbeddingBatcher, or None if EMBEDDING_MICROBATCH is disabled.'''
+    global _batcher
+    if not EMBEDDING_MICROBATCH:
+        return None
+    with _batcher_lock:
+        if _batcher is None:
+            _batcher = EmbeddingBatcher(_encode, EMBEDDING_MICROBATCH_WAIT_MS, EMBEDDING_MICROBATCH_MAX_SIZE)
+    return _batcher
+
+
+def get_batcher_stats():
+    '''Return micro-batching metrics (batch size distribution, queueing delay), or None if disabled.'''
+    batcher = get_batcher()
+    return batcher.stats() if batcher is not None else None
+
+
+def embed_array(text, model=None, batch_size=None, use_pool=False):
+    '''
+    Generate embeddings for text as a contiguous float32 numpy array.
+
+    This is the allocation-free counterpart of embed_text: vectors stay in one float32 buffer instead of
+    being expanded into Python floats, and can be handed to the vector store as-is.
+
+    When EMBEDDING_CACHE_PATH is set, embeddings from the shared model are read from and written to the
+    persistent cache; injected models bypass it since their vectors cannot be attributed to EMBEDDING_MODEL.
+    When EMBEDDING_MICROBATCH is enabled, single texts embedded with the shared model from concurrent threads
+    are coalesced into one forward pass.
 
     Parameters:
         text (str or list of str): The input text or list of texts to embed.
+        model (SentenceTransformer, optional): Model to use instead of the shared instance.
+        batch_size (int, optional): Number of texts per forward pass when embedding a list. Defaults to EMBEDDING_BATCH_SIZE.
+        use_pool (bool, optional): Split a list across the EMBEDDING_POOL_WORKERS processes of the embedding pool, if
+            enabled, instead of encoding it in this process. Ignored when model is given. Defaults to False.
 
     Returns:
-        list: The generated embedding(s) as a list.
+        numpy.ndarray: A 1-D vector for a single text, or a 2-D (len(text), dimension) array for a list.
     '''
     try:
-        model_instance = get_model(model)
-        embeddings = model_instance.encode(text).tolist()
+        batcher = get_batcher() if model is None and isinstance(text, str) else None
+        pool = get_embedding_pool() if use_pool and model is None else None
+        if batcher is not None:
+            embeddings = batcher.embed(text)
+        else:
+            embeddings = _encode(text, model, batch_size, pool)
         if logger.isEnabledFor(logging.DEBUG):
             logger.debug(f'Generated embeddings for text: {text[:50]}...')
-        return embeddings
+        return np.ascontiguousarray(embeddings, dtype=np.float32)
     except Exception as e:
         logger.error(f'Embedding failed: {str(e)}')
         reset_model()
-        raise
\ No newline at end of file
+        raise
+
+
+def embed_text(text, model=None, batch_size=None):
+    '''
+    Generate embeddings for text using SentenceTransformer.
+
+    Same as embed_array, converted to (nested) lists of Python floats.
+
+    Parameters:
+        text (str or list of str): The input text or list of texts to embed.
+        model (SentenceTransformer, optional): Model to use instead of the shared instance.
+        batch_size (int, optional): Number of texts per forward pass when embedding a list. Defaults to EMBEDDING_BATCH_SIZE.
+
+    Returns:
+        list: The generated embedding(s) as a list.
+    '''
+    return embed_array(text, model, batch_size).tolist()
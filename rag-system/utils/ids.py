@@ -0,0 +1,12 @@
+# utils/ids.py
+# Stable Qdrant point IDs derived from chunk IDs
+
+import uuid
+
+# Namespace for deriving stable Qdrant point IDs from 'source:page:index' chunk IDs
+POINT_ID_NAMESPACE = uuid.UUID('6f1c9a52-3c1e-4b0e-9a57-6d0f2a8e4c11')
+
+
+def point_id(chunk_id: str) -> str:
+    '''Derive a stable UUID point ID from a chunk ID built by create_chunk_ids.'''
+    return str(uuid.uuid5(POINT_ID_NAMESPACE, chunk_id))
@@ -0,0 +1,429 @@
+# utils/numpy_store.py
+# In-process vector store keeping normalized float32 vectors in a memory-mapped matrix
+
+from pathlib import Path
+from types import SimpleNamespace
+import json
+import logging
+import os
+import shutil
+import threading
+import numpy as np
+from qdrant_client.models import CountResult, PointIdsList, Record, ScoredPoint
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+VECTORS_FILE = 'vectors.f32'
+META_FILE = 'meta.json'
+LOG_FILE = 'points.jsonl'
+
+# Rows allocated when a collection is created; capacity doubles whenever it runs out
+_INITIAL_CAPACITY = 1024
+
+
+def _matches(condition, payload):
+    '''Evaluate a Qdrant FieldCondition (match value/any or range) against a payload dict.'''
+    value = payload.get(condition.key)
+    if condition.match is not None:
+        match = condition.match
+        if hasattr(match, 'any'):
+            return value in match.any
+        return value == match.value
+    if condition.range is not None:
+        if value is None:
+            return False
+        bounds = condition.range
+        return ((bounds.gt is None or value > bounds.gt) and (bounds.gte is None or value >= bounds.gte)
+                and (bounds.lt is None or value < bounds.lt) and (bounds.lte is None or value <= bounds.lte))
+    raise ValueError(f'Unsupported filter condition on {condition.key}')
+
+
+class _Collection:
+    '''
+    One collection on disk: a (capacity, dimension) float32 memmap, and an append-only log of point ids and
+    payloads that is replayed on open and compacted once it grows well past the number of live points.
+    '''
+
+    def __init__(self, path: Path):
+        self.path = path
+        meta = json.loads((path / META_FILE).read_text(encoding='utf-8'))
+        self.dimension = meta['dimension']
+        self.capacity = meta['capacity']
+        self.vectors = np.memmap(path / VECTORS_FILE, dtype=np.float32, mode='r+', shape=(self.capacity, self.dimension))
+        self.ids = []            # row -> point id (None for free rows)
+        self.payloads = []       # row -> payload dict
+        self.rows = {}           # point id -> row
+        self.free = []
+        self.index_schemas = meta.get('payload_indexes', {})
+        self.indexes = {field: {} for field in self.index_schemas}
+        self._log_records = 0
+        self._replay()
+        self.alive = np.zeros(self.capacity, dtype=bool)
+        self.alive[list(self.rows.values())] = True
+        self._log = open(path / LOG_FILE, 'a', encoding='utf-8')
+
+    @classmethod
+    def create(cls, path: Path, dimension: int):
+        path.mkdir(parents=True, exist_ok=True)
+        np.memmap(path / VECTORS_FILE, dtype=np.float32, mode='w+', shape=(_INITIAL_CAPACITY, dimension)).flush()
+        (path / LOG_FILE).touch()
+        cls._write_meta(path, {'dimension': dimension, 'capacity': _INITIAL_CAPACITY, 'payload_indexes': {}})
+        return cls(path)
+
+    @staticmethod
+    def _write_meta(path: Path, meta):
+        tmp_path = path / (META_FILE + '.tmp')
+        tmp_path.write_text(json.dumps(meta), encoding='utf-8')
+        os.replace(tmp_path, path / META_FILE)
+
+    def _save_meta(self):
+        self._write_meta(self.path, {
+            'dimension': self.dimension, 'capacity': self.capacity, 'payload_indexes': self.index_schemas,
+        })
+
+    def _replay(self):
+        with open(self.path / LOG_FILE, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    logger.warning(f'Ignoring truncated record in {self.path / LOG_FILE}')
+                    break
+                self._log_records += 1
+                op = record['op']
+                if op == 'upsert':
+                    self._assign(record['id'], record['row'], record['payload'])
+                elif op == 'delete':
+                    self._release(record['id'])
+                elif op == 'set_payload':
+                    self._merge_payload(record['id'], record['payload'])
+        self.free = sorted(set(range(len(self.ids))) - set(self.rows.values()), reverse=True)
+
+    # Bookkeeping shared by replay and live updates
+
+    def _assign(self, point_id, row, payload):
+        old_row = self.rows.get(point_id)
+        if old_row is not None and old_row != row:
+            self._release(point_id)
+        elif old_row == row:
+            self._unindex(row, self.payloads[row])
+        while len(self.ids) <= row:
+            self.ids.append(None)
+            self.payloads.append(None)
+        self.ids[row] = point_id
+        self.payloads[row] = payload
+        self.rows[point_id] = row
+        self._index(row, payload)
+
+    def _release(self, point_id):
+        row = self.rows.pop(point_id, None)
+        if row is None:
+            return None
+        self._unindex(row, self.payloads[row])
+        self.ids[row] = None
+        self.payloads[row] = None
+        return row
+
+    def _merge_payload(self, point_id, payload):
+        row = self.rows.get(point_id)
+        if row is not None:
+            self._unindex(row, self.payloads[row])
+            self.payloads[row] = {**self.payloads[row], **payload}
+            self._index(row, self.payloads[row])
+
+    def _index(self, row, payload):
+        for field, index in self.indexes.items():
+            if payload.get(field) is not None:
+                index.setdefault(payload[field], set()).add(row)
+
+    def _unindex(self, row, payload):
+        for field, index in self.indexes.items():
+            rows = index.get(payload.get(field))
+            if rows is not None:
+                rows.discard(row)
+                if not rows:
+                    del index[payload[field]]
+
+    def _append(self, records):
+        self._log.write(''.join(json.dumps(record) + '\n' for record in records))
+        self._log.flush()
+        self._log_records += len(records)
+
+    def _grow(self, needed: int):
+        capacity = self.capacity
+        while capacity < needed:
+            capacity *= 2
+        if capacity == self.capacity:
+            return
+        self.vectors.flush()
+        del self.vectors
+        with open(self.path / VECTORS_FILE, 'r+b') as f:
+            f.truncate(capacity * self.dimension * 4)
+        self.vectors = np.memmap(self.path / VECTORS_FILE, dtype=np.float32, mode='r+', shape=(capacity, self.dimension))
+        self.alive = np.concatenate([self.alive, np.zeros(capacity - self.capacity, dtype=bool)])
+        self.capacity = capacity
+        self._save_meta()
+
+    # Operations
+
+    def upsert(self, ids, vectors, payloads):
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(ids), self.dimension)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.clip(norms, 1e-12, None)
+        rows = []
+        new_rows = {}
+        next_row = len(self.ids)
+        for point_id in ids:
+            row = self.rows.get(point_id, new_rows.get(point_id))
+            if row is None:
+                if self.free:
+                    row = self.free.pop()
+                else:
+                    row, next_row = next_row, next_row + 1
+                new_rows[point_id] = row
+            rows.append(row)
+        self._grow(max(rows) + 1)
+        rows_array = np.asarray(rows)
+        self.vectors[rows_array] = vectors
+        self.vectors.flush()
+        records = []
+        for point_id, row, payload in zip(ids, rows, payloads):
+            payload = dict(payload or {})
+            self._assign(point_id, row, payload)
+            records.append({'op': 'upsert', 'id': point_id, 'row': row, 'payload': payload})
+        self.alive[rows_array] = True
+        self._append(records)
+
+    def delete(self, ids):
+        records = []
+        for point_id in ids:
+            row = self._release(point_id)
+            if row is not None:
+                self.alive[row] = False
+                self.free.append(row)
+                records.append({'op': 'delete', 'id': point_id})
+        self._append(records)
+
+    def set_payload(self, ids, payload):
+        records = []
+        for point_id in ids:
+            if point_id in self.rows:
+                self._merge_payload(point_id, payload)
+                records.append({'op': 'set_payload', 'id': point_id, 'payload': payload})
+        self._append(records)
+
+    def filter_rows(self, query_filter):
+        '''Return a boolean row mask for a Filter of must conditions, or None for no filter.'''
+        if query_filter is None:
+            return None
+        conditions = query_filter.must or []
+        if not isinstance(conditions, list):
+            conditions = [conditions]
+        if query_filter.should or query_filter.must_not:
+            raise ValueError('NumpyVectorStore only supports must conditions')
+        mask = self.alive[:len(self.ids)].copy()
+        for condition in conditions:
+            index = self.indexes.get(condition.key)
+            if index is not None and condition.match is not None:
+                values = condition.match.any if hasattr(condition.match, 'any') else [condition.match.value]
+                selected = np.zeros_like(mask)
+                for value in values:
+                    selected[list(index.get(value, ()))] = True
+                mask &= selected
+            else:
+                candidates = np.flatnonzero(mask)
+                mask[candidates] = [_matches(condition, self.payloads[row]) for row in candidates]
+        return mask
+
+    def search(self, query, limit: int, query_filter=None):
+        size = len(self.ids)
+        if not size or limit <= 0:
+            return []
+        query = np.asarray(query, dtype=np.float32).reshape(self.dimension)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+        mask = self.filter_rows(query_filter)
+        valid = self.alive[:size] if mask is None else mask
+        rows = np.flatnonzero(valid)
+        if not len(rows):
+            return []
+        if len(rows) * 2 < size:
+            # Selective filters: only score the matching rows
+            scores = self.vectors[rows] @ query
+        else:
+            scores = self.vectors[:size] @ query
+            scores[~valid] = -np.inf
+            rows = None
+        k = min(limit, len(scores) if rows is not None else int(valid.sum()))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [(int(rows[i] if rows is not None else i), float(scores[i])) for i in top]
+
+    def compact(self):
+        '''Rewrite the log with one upsert per live point.'''
+        tmp_path = self.path / (LOG_FILE + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for point_id, row in self.rows.items():
+                f.write(json.dumps({'op': 'upsert', 'id': point_id, 'row': row, 'payload': self.payloads[row]}) + '\n')
+        self._log.close()
+        os.replace(tmp_path, self.path / LOG_FILE)
+        self._log = open(self.path / LOG_FILE, 'a', encoding='utf-8')
+        self._log_records = len(self.rows)
+
+    def close(self):
+        if self._log_records > 2 * len(self.rows) + 1000:
+            self.compact()
+        self.vectors.flush()
+        self._log.close()
+
+
+class NumpyVectorStore:
+    """
+    Drop-in replacement for the subset of QdrantClient used by this project, backed by NumPy.
+
+    Each collection keeps its L2-normalized vectors in one contiguous float32 file mapped into memory, so a
+    cosine search is a single BLAS matrix-vector product over the mapped rows followed by an argpartition
+    top-k; the OS page cache, not the Python heap, holds the vectors. Point ids and payloads live in memory and
+    are persisted in an append-only log. Filters support must conditions with match value/any and range;
+    payload indexes turn keyword/integer matches into set lookups. Search params are accepted and ignored since
+    every search is exact. Only one process may open a store for writing at a time.
+
+    Args:
+        path (str): Directory holding one subdirectory per collection.
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._collections = {}
+        self._lock = threading.RLock()
+
+    def _collection(self, collection_name: str):
+        with self._lock:
+            collection = self._collections.get(collection_name)
+            if collection is None:
+                if not (self.path / collection_name / META_FILE).exists():
+                    raise ValueError(f'Collection {collection_name} not found')
+                collection = self._collections[collection_name] = _Collection(self.path / collection_name)
+            return collection
+
+    def collection_exists(self, collection_name: str):
+        return (self.path / collection_name / META_FILE).exists()
+
+    def create_collection(self, collection_name: str, vectors_config, **kwargs):
+        '''Create a collection of vectors_config.size-d vectors; index and quantization settings are ignored.'''
+        with self._lock:
+            if self.collection_exists(collection_name):
+                raise ValueError(f'Collection {collection_name} already exists')
+            self._collections[collection_name] = _Collection.create(self.path / collection_name, vectors_config.size)
+            return True
+
+    def delete_collection(self, collection_name: str, **kwargs):
+        with self._lock:
+            collection = self._collections.pop(collection_name, None)
+            if collection is not None:
+                collection.close()
+            if (self.path / collection_name).exists():
+                shutil.rmtree(self.path / collection_name)
+                return True
+            return False
+
+    def get_collection(self, collection_name: str):
+        '''Return a minimal CollectionInfo-like object (vector size, payload schema and point count).'''
+        with self._lock:
+            collection = self._collection(collection_name)
+            return SimpleNamespace(
+                config=SimpleNamespace(params=SimpleNamespace(vectors=SimpleNamespace(size=collection.dimension))),
+                payload_schema=dict(collection.index_schemas),
+                points_count=len(collection.rows),
+            )
+
+    def create_payload_index(self, collection_name: str, field_name: str, field_schema=None, **kwargs):
+        '''Index exact matches on field_name.'''
+        with self._lock:
+            collection = self._collection(collection_name)
+            if field_name not in collection.indexes:
+                collection.index_schemas[field_name] = getattr(field_schema, 'value', field_schema)
+                collection.indexes[field_name] = {}
+                for row, payload in enumerate(collection.payloads):
+                    if payload is not None and payload.get(field_name) is not None:
+                        collection.indexes[field_name].setdefault(payload[field_name], set()).add(row)
+                collection._save_meta()
+
+    def count(self, collection_name: str, count_filter=None, exact: bool = True, **kwargs):
+        with self._lock:
+            collection = self._collection(collection_name)
+            mask = collection.filter_rows(count_filter)
+            return CountResult(count=len(collection.rows) if mask is None else int(mask.sum()))
+
+    def upload_collection(self, collection_name: str, vectors, payload=None, ids=None, batch_size: int = 64, **kwargs):
+        '''Store a (n, dimension) array of vectors with their ids and payloads.'''
+        ids = list(ids)
+        payloads = list(payload) if payload is not None else [{}] * len(ids)
+        with self._lock:
+            self._collection(collection_name).upsert(ids, vectors, payloads)
+
+    def upsert(self, collection_name: str, points, **kwargs):
+        '''Store PointStructs.'''
+        points = list(points)
+        with self._lock:
+            self._collection(collection_name).upsert(
+                [point.id for point in points], [point.vector for point in points], [point.payload for point in points],
+            )
+
+    def delete(self, collection_name: str, points_selector, **kwargs):
+        ids = points_selector.points if isinstance(points_selector, PointIdsList) else list(points_selector)
+        with self._lock:
+            self._collection(collection_name).delete(ids)
+
+    def set_payload(self, collection_name: str, payload: dict, points, **kwargs):
+        with self._lock:
+            self._collection(collection_name).set_payload(list(points), payload)
+
+    def query_points(self, collection_name: str, query, limit: int = 10, query_filter=None, with_payload=True,
+                     with_vectors=False, **kwargs):
+        '''Return the limit points most cosine-similar to query, as a response whose .points are ScoredPoints.'''
+        with self._lock:
+            collection = self._collection(collection_name)
+            hits = collection.search(query, limit, query_filter)
+            return SimpleNamespace(points=[
+                ScoredPoint(
+                    id=collection.ids[row], version=0, score=score,
+                    payload=collection.payloads[row] if with_payload else None,
+                    vector=collection.vectors[row].tolist() if with_vectors else None,
+                ) for row, score in hits
+            ])
+
+    def _record(self, collection, row, with_payload, with_vectors):
+        return Record(
+            id=collection.ids[row],
+            payload=collection.payloads[row] if with_payload else None,
+            vector=collection.vectors[row].tolist() if with_vectors else None,
+        )
+
+    def retrieve(self, collection_name: str, ids, with_payload=True, with_vectors=False, **kwargs):
+        with self._lock:
+            collection = self._collection(collection_name)
+            return [
+                self._record(collection, collection.rows[point_id], with_payload, with_vectors)
+                for point_id in ids if point_id in collection.rows
+            ]
+
+    def scroll(self, collection_name: str, scroll_filter=None, limit: int = 10, offset=None, with_payload=True,
+               with_vectors=False, **kwargs):
+        '''Page through points in row order; offset is the row to start from, as returned by the previous call.'''
+        with self._lock:
+            collection = self._collection(collection_name)
+            mask = collection.filter_rows(scroll_filter)
+            valid = collection.alive[:len(collection.ids)] if mask is None else mask
+            rows = np.flatnonzero(valid[offset or 0:]) + (offset or 0)
+            page = rows[:limit]
+            next_offset = int(rows[limit]) if len(rows) > limit else None
+            return [self._record(collection, int(row), with_payload, with_vectors) for row in page], next_offset
+
+    def close(self, **kwargs):
+        with self._lock:
+            for collection in self._collections.values():
+                collection.close()
+            self._collections = {}
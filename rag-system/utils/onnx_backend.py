@@ -0,0 +1,195 @@
+# utils/onnx_backend.py
+# ONNX Runtime CPU backend for the sentence embedding model, with optional dynamic int8 quantization
+
+from pathlib import Path
+import json
+import logging
+import os
+import shutil
+import tempfile
+import numpy as np
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+ONNX_FILE = 'model.onnx'
+ONNX_INT8_FILE = 'model-int8.onnx'
+CONFIG_FILE = 'encoder.json'
+
+
+def export_model(model_name: str, export_dir: str):
+    '''
+    Export a SentenceTransformer's transformer module to ONNX, together with its tokenizer and pooling settings.
+
+    Only the transformer runs in ONNX; pooling and normalization are recorded in encoder.json and
+    reproduced in numpy by OnnxSentenceEncoder.
+    '''
+    import torch
+    from sentence_transformers import SentenceTransformer
+    from sentence_transformers.models import Normalize, Pooling
+
+    export_path = Path(export_dir)
+    export_path.mkdir(parents=True, exist_ok=True)
+    logger.info(f'Exporting {model_name} to ONNX in {export_path}')
+
+    st_model = SentenceTransformer(model_name, device='cpu')
+    transformer = st_model[0]
+    pooling = next((module for module in st_model if isinstance(module, Pooling)), None)
+    if pooling is None:
+        raise ValueError(f'{model_name} has no Pooling module')
+    # Older sentence-transformers expose the mode through get_pooling_mode_str()
+    pooling_mode = pooling.get_pooling_mode_str() if hasattr(pooling, 'get_pooling_mode_str') else pooling.pooling_mode
+    if pooling_mode not in ('mean', 'cls', 'max'):
+        raise ValueError(f'Unsupported pooling for ONNX export: {pooling_mode}')
+
+    tokenizer = transformer.tokenizer
+    tokenizer.save_pretrained(export_path)
+    sample = tokenizer(['an example sentence'], return_tensors='pt')
+    input_names = [name for name in ('input_ids', 'attention_mask', 'token_type_ids') if name in sample]
+    auto_model = transformer.auto_model.eval()
+
+    class _Wrapper(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, *inputs):
+            return self.model(**dict(zip(input_names, inputs))).last_hidden_state
+
+    dynamic_axes = {name: {0: 'batch', 1: 'sequence'} for name in input_names}
+    dynamic_axes['last_hidden_state'] = {0: 'batch', 1: 'sequence'}
+    with torch.no_grad():
+        torch.onnx.export(
+            _Wrapper(auto_model),
+            tuple(sample[name] for name in input_names),
+            str(export_path / ONNX_FILE),
+            input_names=input_names,
+            output_names=['last_hidden_state'],
+            dynamic_axes=dynamic_axes,
+            opset_version=17,
+            dynamo=False,
+        )
+
+    config = {
+        'model_name': model_name,
+        'input_names': input_names,
+        'pooling': pooling_mode,
+        'normalize': any(isinstance(module, Normalize) for module in st_model),
+        'max_seq_length': st_model.max_seq_length,
+        'dimension': st_model.get_sentence_embedding_dimension(),
+    }
+    (export_path / CONFIG_FILE).write_text(json.dumps(config, indent=2), encoding='utf-8')
+    return export_path
+
+
+def quantize_model(export_dir: str):
+    '''Write a dynamically int8-quantized copy of the exported model next to it.'''
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    export_path = Path(export_dir)
+    logger.info(f'Quantizing {export_path / ONNX_FILE} to int8')
+    quantize_dynamic(str(export_path / ONNX_FILE), str(export_path / ONNX_INT8_FILE), weight_type=QuantType.QInt8)
+    return export_path / ONNX_INT8_FILE
+
+
+def _publish(staging: Path, export_path: Path):
+    '''Move every file of staging into export_path with atomic renames, encoder.json last.'''
+    export_path.mkdir(parents=True, exist_ok=True)
+    for name in sorted((path.name for path in staging.iterdir()), key=lambda name: name == CONFIG_FILE):
+        os.replace(staging / name, export_path / name)
+
+
+def ensure_exported(model_name: str, export_dir: str, quantized: bool = False):
+    '''
+    Export (and quantize) the model into export_dir unless that has been done already.
+
+    Work happens in a temporary sibling directory whose files are renamed into place, encoder.json last, so a
+    concurrent reader (e.g. another embedding pool worker) only ever sees complete files, and sees encoder.json
+    only once the model it describes is in place.
+    '''
+    export_path = Path(export_dir)
+    export_path.parent.mkdir(parents=True, exist_ok=True)
+    if not (export_path / CONFIG_FILE).exists():
+        staging = Path(tempfile.mkdtemp(prefix=f'.{export_path.name}.', dir=export_path.parent))
+        try:
+            export_model(model_name, staging)
+            _publish(staging, export_path)
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+    if quantized and not (export_path / ONNX_INT8_FILE).exists():
+        staging = Path(tempfile.mkdtemp(prefix=f'.{export_path.name}.', dir=export_path.parent))
+        try:
+            shutil.copy2(export_path / ONNX_FILE, staging / ONNX_FILE)
+            quantize_model(staging)
+            os.replace(staging / ONNX_INT8_FILE, export_path / ONNX_INT8_FILE)
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+    return export_path
+
+
+class OnnxSentenceEncoder:
+    """
+    ONNX Runtime replacement for the parts of SentenceTransformer used by this project.
+
+    The model is exported (and quantized, if requested) on first use and cached in export_dir. encode()
+    mirrors SentenceTransformer.encode: texts are sorted by length to minimise padding, run in batches,
+    pooled and optionally L2-normalized, and returned as float32 numpy arrays in input order.
+
+    Args:
+        model_name (str): SentenceTransformer model name or path.
+        export_dir (str): Directory holding the exported model.
+        quantized (bool, optional): Use the dynamically int8-quantized model. Defaults to False.
+        threads (int, optional): Intra-op threads for ONNX Runtime; 0 lets it decide. Defaults to 0.
+    """
+
+    def __init__(self, model_name: str, export_dir: str, quantized: bool = False, threads: int = 0):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        export_path = ensure_exported(model_name, export_dir, quantized)
+
+        self.config = json.loads((export_path / CONFIG_FILE).read_text(encoding='utf-8'))
+        self.tokenizer = AutoTokenizer.from_pretrained(str(export_path))
+        self.max_seq_length = self.config['max_seq_length']
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        model_file = ONNX_INT8_FILE if quantized else ONNX_FILE
+        self.session = ort.InferenceSession(str(export_path / model_file), options, providers=['CPUExecutionProvider'])
+        logger.info(f'Loaded ONNX encoder {export_path / model_file}')
+
+    def get_sentence_embedding_dimension(self):
+        return self.config['dimension']
+
+    def _pool(self, hidden, attention_mask):
+        mode = self.config['pooling']
+        if mode == 'cls':
+            pooled = hidden[:, 0]
+        elif mode == 'max':
+            pooled = np.where(attention_mask[:, :, None] > 0, hidden, -np.inf).max(axis=1)
+        else:
+            mask = attention_mask[:, :, None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        if self.config['normalize']:
+            pooled = pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        return pooled.astype(np.float32)
+
+    def encode(self, sentences, batch_size: int = 32, **kwargs):
+        '''Embed a text or list of texts; extra SentenceTransformer.encode keyword arguments are ignored.'''
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        if not texts:
+            return np.empty((0, self.get_sentence_embedding_dimension()), dtype=np.float32)
+        order = np.argsort([-len(text) for text in texts], kind='stable')
+        embeddings = np.empty((len(texts), self.get_sentence_embedding_dimension()), dtype=np.float32)
+        for start in range(0, len(texts), batch_size):
+            indices = order[start:start + batch_size]
+            features = self.tokenizer(
+                [texts[i] for i in indices], padding=True, truncation=True,
+                max_length=self.max_seq_length, return_tensors='np',
+            )
+            inputs = {name: features[name].astype(np.int64) for name in self.config['input_names']}
+            hidden = self.session.run(None, inputs)[0]
+            embeddings[indices] = self._pool(hidden, features['attention_mask'])
+        return embeddings[0] if single else embeddings
@@ -0,0 +1,123 @@
+# utils/projection.py
+# Optional PCA projection reducing embeddings to PCA_DIM dimensions before they are stored or searched
+
+from pathlib import Path
+import logging
+import os
+import threading
+import numpy as np
+from config import PCA_DIM, PCA_PATH, EMBEDDING_MODEL
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Projection fitted for the collection, loaded on first use
+_projection = None
+_projection_lock = threading.Lock()
+
+
+class PCAProjection:
+    """
+    Linear projection of embeddings onto their top principal components.
+
+    The components are those of the uncentered second-moment matrix: subtracting the mean would change the
+    angles between vectors, so a full-rank projection would no longer rank neighbours like the original
+    vectors do. Projected vectors are L2-normalized again, so cosine scores stay comparable.
+
+    Args:
+        components (numpy.ndarray): Principal axes as rows, shape (target dimension, dimension).
+        model_name (str, optional): Embedding model the projection was fitted for. Defaults to EMBEDDING_MODEL.
+        explained_variance_ratio (float, optional): Share of the sample's variance kept by the components.
+    """
+
+    def __init__(self, components, model_name: str = EMBEDDING_MODEL, explained_variance_ratio: float = None):
+        self.components = np.ascontiguousarray(components, dtype=np.float32)
+        self.model_name = model_name
+        self.explained_variance_ratio = explained_variance_ratio
+
+    @property
+    def dimension(self):
+        return self.components.shape[0]
+
+    @classmethod
+    def fit(cls, vectors, dimension: int, model_name: str = EMBEDDING_MODEL):
+        '''
+        Fit a projection to dimension components on a (n, input dimension) sample of embeddings.
+
+        The sample needs at least dimension vectors: beyond the sample's rank the components would be arbitrary
+        directions, and a saved projection is kept for the life of the collection.
+        '''
+        vectors = np.asarray(vectors, dtype=np.float64)
+        if vectors.ndim != 2 or not len(vectors):
+            raise ValueError('PCA needs a non-empty 2-D sample of vectors')
+        if not 0 < dimension <= vectors.shape[1]:
+            raise ValueError(f'PCA dimension must be between 1 and {vectors.shape[1]}')
+        if len(vectors) < dimension:
+            raise ValueError(f'PCA to {dimension} dimensions needs at least {dimension} sample vectors, got {len(vectors)}')
+        eigenvalues, eigenvectors = np.linalg.eigh(vectors.T @ vectors / len(vectors))
+        order = np.argsort(eigenvalues)[::-1][:dimension]
+        total = eigenvalues.clip(min=0).sum()
+        explained = float(eigenvalues[order].clip(min=0).sum() / total) if total > 0 else 1.0
+        logger.info(f'Fitted PCA {vectors.shape[1]} -> {dimension} on {len(vectors)} vectors '
+                    f'({explained:.1%} of variance kept)')
+        return cls(eigenvectors[:, order].T, model_name, explained)
+
+    def transform(self, vectors):
+        '''Project a vector or (n, input dimension) array, returning normalized float32 vectors.'''
+        projected = np.asarray(vectors, dtype=np.float32) @ self.components.T
+        norms = np.linalg.norm(projected, axis=-1, keepdims=True)
+        return np.ascontiguousarray(projected / np.clip(norms, 1e-12, None), dtype=np.float32)
+
+    def save(self, path: str):
+        '''Atomically write the projection to an .npz file.'''
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + '.tmp')
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, components=self.components, model_name=np.array(self.model_name),
+                     explained_variance_ratio=np.array(self.explained_variance_ratio or np.nan))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str):
+        '''Load a projection written by save().'''
+        with np.load(path) as data:
+            ratio = float(data['explained_variance_ratio'])
+            return cls(data['components'], str(data['model_name']), None if np.isnan(ratio) else ratio)
+
+
+def get_projection():
+    '''
+    Return the collection's PCA projection, or None if PCA_DIM is 0 or no projection has been fitted yet.
+
+    Raises:
+        ValueError: If the stored projection does not match PCA_DIM or EMBEDDING_MODEL.
+    '''
+    global _projection
+    if PCA_DIM <= 0:
+        return None
+    with _projection_lock:
+        if _projection is None and Path(PCA_PATH).exists():
+            projection = PCAProjection.load(PCA_PATH)
+            if projection.dimension != PCA_DIM or projection.model_name != EMBEDDING_MODEL:
+                raise ValueError(f'PCA projection in {PCA_PATH} was fitted for {projection.model_name} '
+                                 f'with {projection.dimension} dimensions; re-ingest into a new collection')
+            logger.info(f'Loaded PCA projection from {PCA_PATH}')
+            _projection = projection
+        return _projection
+
+
+def set_projection(projection):
+    '''Save projection to PCA_PATH and make it the collection's projection.'''
+    global _projection
+    with _projection_lock:
+        projection.save(PCA_PATH)
+        _projection = projection
+
+
+def reset_projection():
+    '''Forget the loaded projection so it is re-read from PCA_PATH on next use.'''
+    global _projection
+    with _projection_lock:
+        _projection = None
@@ -2,46 +2,209 @@
 # Shared utility for Qdrant client setup with singleton pattern
 
 from qdrant_client import QdrantClient
-from qdrant_client.models import VectorParams, Distance
-from config import QDRANT_PATH, QDRANT_COLLECTION, VECTOR_DIMENSION
+from qdrant_client.models import VectorParams, Distance, ScalarQuantization, ScalarQuantizationConfig, ScalarType, \
+    BinaryQuantization, BinaryQuantizationConfig, SearchParams, QuantizationSearchParams, HnswConfigDiff, \
+    OptimizersConfigDiff, PayloadSchemaType, Filter, FieldCondition, MatchValue, MatchAny, Range
+from utils.numpy_store import NumpyVectorStore
+from config import VECTOR_BACKEND, NUMPY_STORE_PATH, QDRANT_URL, QDRANT_API_KEY, QDRANT_PREFER_GRPC, QDRANT_GRPC_PORT, QDRANT_TIMEOUT, QDRANT_PATH, \
+    QDRANT_COLLECTION, VECTOR_DIMENSION, PCA_DIM, QDRANT_QUANTIZATION, \
+    QDRANT_QUANTIZATION_ALWAYS_RAM, QDRANT_VECTORS_ON_DISK, QDRANT_SCALAR_QUANTILE, QDRANT_SEARCH_RESCORE, \
+    QDRANT_SEARCH_OVERSAMPLING, HNSW_M, HNSW_EF_CONSTRUCT, QDRANT_INDEXING_THRESHOLD, HNSW_EF
 import logging
+import os
+import threading
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Payload fields stored at ingest that filtered searches can use, and their index types
+PAYLOAD_INDEXES = {
+    'source': PayloadSchemaType.KEYWORD,
+    'chunk_id': PayloadSchemaType.KEYWORD,
+    'doc_hash': PayloadSchemaType.KEYWORD,
+    'page': PayloadSchemaType.INTEGER,
+    'mtime': PayloadSchemaType.FLOAT,
+}
+
 # Initialize global Qdrant client
 _client = None
+# Process that created _client; a forked worker must open its own connection
+_client_pid = None
+_client_lock = threading.RLock()
+
+
+def get_index_dimension():
+    '''Return the dimension of stored vectors: PCA_DIM when PCA projection is enabled, else VECTOR_DIMENSION.'''
+    return PCA_DIM or VECTOR_DIMENSION
+
+
+def get_quantization_config(quantization: str = None):
+    '''Return the Qdrant quantization config for 'scalar' or 'binary' (default: QDRANT_QUANTIZATION), or None for 'none'.'''
+    quantization = quantization or QDRANT_QUANTIZATION
+    if quantization == 'scalar':
+        return ScalarQuantization(scalar=ScalarQuantizationConfig(
+            type=ScalarType.INT8, quantile=QDRANT_SCALAR_QUANTILE, always_ram=QDRANT_QUANTIZATION_ALWAYS_RAM,
+        ))
+    if quantization == 'binary':
+        return BinaryQuantization(binary=BinaryQuantizationConfig(always_ram=QDRANT_QUANTIZATION_ALWAYS_RAM))
+    if quantization == 'none':
+        return None
+    raise ValueError(f'Unknown quantization: {quantization}')
+
+
+def get_search_params(rescore: bool = None, oversampling: float = None, ef: int = None, exact: bool = False):
+    '''
+    Build the search params matching the collection's configuration, or None if the defaults apply.
+
+    With quantization enabled, limit * oversampling candidates are found with the quantized vectors and,
+    if rescore is set, re-ranked with the original ones. A larger ef raises HNSW recall at the cost of latency;
+    exact bypasses the index altogether.
+
+    Parameters:
+        rescore (bool, optional): Re-rank candidates with the original vectors. Defaults to QDRANT_SEARCH_RESCORE.
+        oversampling (float, optional): Candidate multiplier for quantized search. Defaults to QDRANT_SEARCH_OVERSAMPLING.
+        ef (int, optional): HNSW candidate list size for this search. Defaults to HNSW_EF (0: Qdrant's default).
+        exact (bool, optional): Run an exact (brute-force) search. Defaults to False.
+
+    Returns:
+        SearchParams or None: Parameters to pass to query_points.
+    '''
+    ef = ef or HNSW_EF or None
+    quantization = None
+    if QDRANT_QUANTIZATION != 'none':
+        quantization = QuantizationSearchParams(
+            rescore=QDRANT_SEARCH_RESCORE if rescore is None else rescore,
+            oversampling=oversampling or QDRANT_SEARCH_OVERSAMPLING,
+        )
+    if ef is None and not exact and quantization is None:
+        return None
+    return SearchParams(hnsw_ef=ef, exact=exact, quantization=quantization)
+
+
+def build_filter(filters: dict = None):
+    '''
+    Build a Qdrant Filter requiring every payload field in filters to match.
+
+    Values may be a single value (exact match), a list or tuple (match any of them), or a dict with
+    'gt', 'gte', 'lt' and/or 'lte' keys (numeric range). Returns None for no filters.
+    '''
+    if not filters:
+        return None
+    conditions = []
+    for key, value in filters.items():
+        if isinstance(value, dict):
+            conditions.append(FieldCondition(key=key, range=Range(**value)))
+        elif isinstance(value, (list, tuple, set)):
+            conditions.append(FieldCondition(key=key, match=MatchAny(any=list(value))))
+        else:
+            conditions.append(FieldCondition(key=key, match=MatchValue(value=value)))
+    return Filter(must=conditions)
+
+
+def supports_payload_indexes():
+    '''Whether the configured store has payload indexes (a Qdrant server or the NumPy store, not embedded Qdrant).'''
+    return VECTOR_BACKEND == 'numpy' or bool(QDRANT_URL)
+
+
+def supports_concurrent_upserts():
+    '''Whether the configured store is a Qdrant server, which accepts concurrent, unacknowledged upserts.'''
+    return VECTOR_BACKEND == 'qdrant' and bool(QDRANT_URL)
+
+
+def ensure_payload_indexes(client, collection: str):
+    '''Create the PAYLOAD_INDEXES that the collection is missing, if the store supports payload indexes.'''
+    if not supports_payload_indexes():
+        return
+    existing = client.get_collection(collection).payload_schema or {}
+    for field, schema in PAYLOAD_INDEXES.items():
+        if field not in existing:
+            logger.info(f'Creating payload index on {field} ({schema.value})')
+            client.create_payload_index(collection_name=collection, field_name=field, field_schema=schema, wait=True)
+
+
+def create_client():
+    '''
+    Open a Qdrant client: the server at QDRANT_URL if set, else the embedded store at QDRANT_PATH (or ':memory:').
+    With VECTOR_BACKEND='numpy', a NumpyVectorStore at NUMPY_STORE_PATH is returned instead.
+
+    Server clients keep one HTTP connection pool (or gRPC channel with QDRANT_PREFER_GRPC) for their lifetime,
+    so reusing the client reuses connections.
+    '''
+    if VECTOR_BACKEND == 'numpy':
+        logger.info(f'Initializing NumPy vector store with path: {NUMPY_STORE_PATH}')
+        return NumpyVectorStore(NUMPY_STORE_PATH)
+    if QDRANT_URL:
+        logger.info(f'Connecting to Qdrant server at {QDRANT_URL} (gRPC: {QDRANT_PREFER_GRPC})')
+        return QdrantClient(url=QDRANT_URL, api_key=QDRANT_API_KEY, prefer_grpc=QDRANT_PREFER_GRPC,
+                            grpc_port=QDRANT_GRPC_PORT, timeout=QDRANT_TIMEOUT)
+    if QDRANT_PATH == ':memory:':
+        logger.info('Initializing in-memory Qdrant client')
+        return QdrantClient(location=':memory:')
+    logger.info(f'Initializing Qdrant client with path: {QDRANT_PATH}')
+    return QdrantClient(path=QDRANT_PATH)
 
 
 def get_qdrant_client(client=None):
-    '''Get or initialize the Qdrant client singleton and ensure collection exists.'''
-    global _client
+    '''
+    Get or initialize the Qdrant client singleton and ensure collection exists.
+
+    Initialization is guarded by a lock so concurrent first calls share one client, and a process forked after
+    initialization opens its own client instead of reusing the parent's connections.
+
+    New collections are created with the HNSW_M, HNSW_EF_CONSTRUCT and QDRANT_INDEXING_THRESHOLD index settings and
+    QDRANT_QUANTIZATION (and QDRANT_VECTORS_ON_DISK); the settings of an existing collection are left as they are.
+    Payload indexes on the PAYLOAD_INDEXES fields are added to new and existing collections so filtered searches
+    stay fast. The embedded (path or ':memory:') mode has no indexes and always searches exactly.
+    '''
+    global _client, _client_pid
     if client is not None:
         return client, QDRANT_COLLECTION  # Use injected client for testing
-    if _client is None:
-        try:
-            logger.info(f'Initializing Qdrant client with path: {QDRANT_PATH}')
-            _client = QdrantClient(path=QDRANT_PATH)
-            if not _client.collection_exists(QDRANT_COLLECTION):
-                logger.info(f'Creating Qdrant collection: {QDRANT_COLLECTION}')
-                _client.create_collection(
-                    collection_name=QDRANT_COLLECTION,
-                    vectors_config=VectorParams(size=VECTOR_DIMENSION, distance=Distance.COSINE),
-                )
-        except Exception as e:
-            logger.error(f'Failed to initialize Qdrant client: {str(e)}')
-            raise
-    return _client, QDRANT_COLLECTION
+    with _client_lock:
+        if _client is not None and _client_pid != os.getpid():
+            # Connections inherited through fork are shared with the parent; start afresh
+            _client, _client_pid = None, None
+        if _client is None:
+            _init_client()
+        return _client, QDRANT_COLLECTION
+
+
+def _init_client():
+    '''Open the client and create or check the collection; the caller holds _client_lock.'''
+    global _client, _client_pid
+    try:
+        _client = create_client()
+        _client_pid = os.getpid()
+        dimension = get_index_dimension()
+        if not _client.collection_exists(QDRANT_COLLECTION):
+            logger.info(f'Creating Qdrant collection: {QDRANT_COLLECTION}')
+            _client.create_collection(
+                collection_name=QDRANT_COLLECTION,
+                vectors_config=VectorParams(size=dimension, distance=Distance.COSINE, on_disk=QDRANT_VECTORS_ON_DISK),
+                hnsw_config=HnswConfigDiff(m=HNSW_M, ef_construct=HNSW_EF_CONSTRUCT),
+                optimizers_config=OptimizersConfigDiff(indexing_threshold=QDRANT_INDEXING_THRESHOLD),
+                quantization_config=get_quantization_config(),
+            )
+        else:
+            existing = _client.get_collection(QDRANT_COLLECTION).config.params.vectors.size
+            if existing != dimension:
+                raise ValueError(f'Collection {QDRANT_COLLECTION} stores {existing}-d vectors but {dimension} are '
+                                 f'configured (VECTOR_DIMENSION/PCA_DIM); use a new collection')
+        ensure_payload_indexes(_client, QDRANT_COLLECTION)
+    except Exception as e:
+        logger.error(f'Failed to initialize Qdrant client: {str(e)}')
+        reset_qdrant_client()
+        raise
 
 
 def reset_qdrant_client():
     '''Reset the Qdrant client singleton to handle errors or updates.'''
-    global _client
-    if _client is not None:
-        try:
-            _client.close()
-        except Exception as e:
-            logger.error(f'Failed to close Qdrant client: {str(e)}')
-        _client = None
-        logger.info('Qdrant client reset')
\ No newline at end of file
+    global _client, _client_pid
+    with _client_lock:
+        if _client is not None:
+            try:
+                _client.close()
+            except Exception as e:
+                logger.error(f'Failed to close Qdrant client: {str(e)}')
+            _client, _client_pid = None, None
+            logger.info('Qdrant client reset')
\ No newline at end of file
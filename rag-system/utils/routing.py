@@ -0,0 +1,102 @@
+# utils/routing.py
+# Per-document centroid vectors used to route queries to the few most relevant sources
+
+from collections import defaultdict
+import logging
+import numpy as np
+from qdrant_client.models import Distance, PayloadSchemaType, PointIdsList, VectorParams
+from utils.ids import point_id
+from utils.qdrant_utils import build_filter, supports_payload_indexes
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def centroid_collection_name(collection: str) -> str:
+    '''Return the name of the collection holding the centroids of collection's sources.'''
+    return f'{collection}_centroids'
+
+
+def ensure_centroid_collection(client, collection: str, dimension: int):
+    '''Create the centroid collection of collection if it does not exist yet.'''
+    name = centroid_collection_name(collection)
+    if not client.collection_exists(name):
+        logger.info(f'Creating centroid collection: {name}')
+        client.create_collection(collection_name=name, vectors_config=VectorParams(size=dimension, distance=Distance.COSINE))
+        if supports_payload_indexes():
+            client.create_payload_index(collection_name=name, field_name='source', field_schema=PayloadSchemaType.KEYWORD)
+    return name
+
+
+class CentroidAccumulator:
+    '''Running per-source sums of chunk vectors, turned into normalized centroids once a source is complete.'''
+
+    def __init__(self):
+        self.sums = {}
+        self.counts = defaultdict(int)
+
+    def add(self, sources, vectors):
+        '''Add one vector per source (rows of vectors, in the order of sources).'''
+        for source, vector in zip(sources, vectors):
+            if source in self.sums:
+                self.sums[source] += vector
+            else:
+                self.sums[source] = np.array(vector, dtype=np.float64)
+            self.counts[source] += 1
+
+    def pop(self, source):
+        '''Return (normalized centroid, chunk count) of source and forget it, or (None, 0) if it had no vectors.'''
+        total = self.sums.pop(source, None)
+        count = self.counts.pop(source, 0)
+        if total is None:
+            return None, 0
+        return (total / max(np.linalg.norm(total), 1e-12)).astype(np.float32), count
+
+
+def upsert_centroids(client, collection: str, centroids):
+    '''Store centroids given as {source: (vector, chunk count)}.'''
+    if not centroids:
+        return
+    sources = sorted(centroids)
+    client.upload_collection(
+        collection_name=centroid_collection_name(collection),
+        vectors=np.stack([centroids[source][0] for source in sources]),
+        payload=[{'source': source, 'chunks': centroids[source][1]} for source in sources],
+        ids=[point_id(source) for source in sources],
+        batch_size=max(len(sources), 1),
+        wait=True,
+    )
+
+
+def delete_centroids(client, collection: str, sources):
+    '''Delete the centroids of sources, if the centroid collection exists.'''
+    name = centroid_collection_name(collection)
+    if sources and client.collection_exists(name):
+        client.delete(collection_name=name, points_selector=PointIdsList(points=[point_id(source) for source in sources]))
+
+
+def route_sources(client, collection: str, query_vector, nprobe: int, source_filter=None):
+    '''
+    Return the nprobe sources whose centroids are most similar to query_vector.
+
+    Parameters:
+        client: Vector store client.
+        collection (str): Collection whose centroids are searched.
+        query_vector (numpy.ndarray): Query vector in the collection's vector space.
+        nprobe (int): Number of sources to return.
+        source_filter (optional): Restrict routing to these sources (a value or list, as in build_filter).
+
+    Returns:
+        list of str: Source paths, best first; empty if no centroids exist.
+    '''
+    name = centroid_collection_name(collection)
+    if not client.collection_exists(name):
+        return []
+    points = client.query_points(
+        collection_name=name,
+        query=query_vector,
+        limit=nprobe,
+        query_filter=build_filter({'source': source_filter}) if source_filter is not None else None,
+    ).points
+    return [point.payload['source'] for point in points]
@@ -0,0 +1,252 @@
+# utils/text_store.py
+# Compressed, memory-mapped side store of chunk texts, kept out of the vector payloads
+
+from collections import OrderedDict
+from pathlib import Path
+import json
+import logging
+import mmap
+import os
+import shutil
+import threading
+import zlib
+from config import TEXT_STORE, TEXT_STORE_PATH, TEXT_STORE_BLOCK_SIZE, TEXT_STORE_CODEC
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional; zlib is always available
+    zstandard = None
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DATA_FILE = 'texts.dat'
+INDEX_FILE = 'texts.idx'
+
+# Decompressed blocks kept for reuse between lookups
+_BLOCK_CACHE_SIZE = 16
+
+# Shared store, opened on first use
+_store = None
+_store_lock = threading.Lock()
+
+
+def _codec(name: str):
+    '''Return (compress, decompress) functions for 'zstd' or 'zlib'.'''
+    if name == 'zstd':
+        if zstandard is None:
+            raise ValueError('The zstandard package is required for zstd text blocks')
+        return zstandard.ZstdCompressor(level=3).compress, zstandard.ZstdDecompressor().decompress
+    if name == 'zlib':
+        return (lambda data: zlib.compress(data, 6)), zlib.decompress
+    raise ValueError(f'Unknown text store codec: {name}')
+
+
+class TextStore:
+    """
+    Append-only store of texts keyed by point ID.
+
+    Texts are packed into blocks of about block_size bytes that are compressed independently and appended to
+    texts.dat, which is memory-mapped for reads, so fetching one text decompresses one block. texts.idx is an
+    append-only JSON-lines index of (block offset, block length, byte span, codec) per ID, with tombstones for
+    deleted IDs; it is replayed on open, and re-read incrementally when another process appends to it. Space held
+    by deleted or replaced texts is reclaimed by compact(). Any number of processes may read, but only one may write.
+
+    Args:
+        path (str): Directory holding the data and index files.
+        block_size (int, optional): Uncompressed bytes per block. Defaults to 65536.
+        codec (str, optional): 'zstd', 'zlib', or 'auto' (zstd when the zstandard package is installed). Defaults to 'auto'.
+    """
+
+    def __init__(self, path: str, block_size: int = 65536, codec: str = 'auto'):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.block_size = block_size
+        self.codec = ('zstd' if zstandard is not None else 'zlib') if codec == 'auto' else codec
+        self._compress = _codec(self.codec)[0]
+        self._decompressors = {}
+        self._lock = threading.RLock()
+        self._blocks = OrderedDict()
+        self._mmap = None
+        self._load()
+
+    def _load(self):
+        (self.path / DATA_FILE).touch()
+        (self.path / INDEX_FILE).touch()
+        self.entries = {}
+        self.dead = 0
+        self._index_position = 0
+        self._index_inode = os.stat(self.path / INDEX_FILE).st_ino
+        self._blocks.clear()
+        self._remap()
+        self._read_index()
+
+    def _remap(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        with open(self.path / DATA_FILE, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._mapped_size = size
+
+    def _read_index(self):
+        with open(self.path / INDEX_FILE, 'rb') as f:
+            f.seek(self._index_position)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break  # Partially written by a concurrent writer; re-read next time
+                self._index_position += len(line)
+                self._apply(json.loads(line))
+
+    def _apply(self, record):
+        if record['id'] in self.entries:
+            self.dead += 1
+        if record.get('d'):
+            self.entries.pop(record['id'], None)
+        else:
+            self.entries[record['id']] = (record['o'], record['n'], record['s'], record['e'], record['c'])
+
+    def refresh(self):
+        '''Pick up texts appended by other processes, reloading everything if the store was compacted.'''
+        with self._lock:
+            stat = os.stat(self.path / INDEX_FILE)
+            if stat.st_ino != self._index_inode or stat.st_size < self._index_position:
+                self._load()
+            elif stat.st_size > self._index_position:
+                self._read_index()
+
+    def _block(self, offset: int, length: int, codec: str):
+        key = (offset, length)
+        block = self._blocks.get(key)
+        if block is None:
+            if offset + length > self._mapped_size:
+                self._remap()
+            if codec not in self._decompressors:
+                self._decompressors[codec] = _codec(codec)[1]
+            block = self._decompressors[codec](self._mmap[offset:offset + length])
+            self._blocks[key] = block
+            if len(self._blocks) > _BLOCK_CACHE_SIZE:
+                self._blocks.popitem(last=False)
+        else:
+            self._blocks.move_to_end(key)
+        return block
+
+    def put_many(self, items):
+        '''Store (id, text) pairs; IDs already present are replaced.'''
+        records = []
+        with self._lock, open(self.path / DATA_FILE, 'ab') as data:
+            offset = data.tell()
+            block, spans = [], []
+            size = 0
+
+            def write_block():
+                nonlocal offset, size
+                compressed = self._compress(b''.join(block))
+                data.write(compressed)
+                for point_id, start, end in spans:
+                    records.append({'id': point_id, 'o': offset, 'n': len(compressed), 's': start, 'e': end, 'c': self.codec})
+                offset += len(compressed)
+                block.clear()
+                spans.clear()
+                size = 0
+
+            for point_id, text in items:
+                encoded = text.encode('utf-8')
+                spans.append((str(point_id), size, size + len(encoded)))
+                block.append(encoded)
+                size += len(encoded)
+                if size >= self.block_size:
+                    write_block()
+            if block:
+                write_block()
+            data.flush()
+        self._append_index(records)
+
+    def delete(self, ids):
+        '''Forget the texts of ids.'''
+        with self._lock:
+            self._append_index([{'id': str(point_id), 'd': 1} for point_id in ids if str(point_id) in self.entries])
+
+    def _append_index(self, records):
+        if not records:
+            return
+        with self._lock:
+            # Catch up with the file first, so our position stays at its end
+            self.refresh()
+            with open(self.path / INDEX_FILE, 'ab') as index:
+                lines = b''.join(json.dumps(record).encode('utf-8') + b'\n' for record in records)
+                index.write(lines)
+                index.flush()
+            self._index_position += len(lines)
+            for record in records:
+                self._apply(record)
+
+    def get_many(self, ids):
+        '''Return {id: text} for the ids that are stored.'''
+        with self._lock:
+            self.refresh()
+            texts = {}
+            for point_id in ids:
+                entry = self.entries.get(str(point_id))
+                if entry is not None:
+                    offset, length, start, end, codec = entry
+                    texts[point_id] = self._block(offset, length, codec)[start:end].decode('utf-8')
+            return texts
+
+    def stats(self):
+        '''Return the number of live texts, dead index records and the compressed data size in bytes.'''
+        with self._lock:
+            return {
+                'texts': len(self.entries),
+                'dead_records': self.dead,
+                'data_bytes': os.path.getsize(self.path / DATA_FILE),
+            }
+
+    def compact(self):
+        '''Rewrite the store with only the live texts and swap it in place.'''
+        with self._lock:
+            self.refresh()
+            shutil.rmtree(self.path / 'compact.tmp', ignore_errors=True)
+            tmp = TextStore(self.path / 'compact.tmp', self.block_size, self.codec)
+            ids = sorted(self.entries, key=lambda point_id: self.entries[point_id][:3])
+            for start in range(0, len(ids), 1024):
+                tmp.put_many(self.get_many(ids[start:start + 1024]).items())
+            tmp.close()
+            os.replace(tmp.path / DATA_FILE, self.path / DATA_FILE)
+            os.replace(tmp.path / INDEX_FILE, self.path / INDEX_FILE)
+            tmp.path.rmdir()
+            self._load()
+            logger.info(f'Compacted text store {self.path} to {len(self.entries)} texts')
+
+    def close(self):
+        '''Compact if most index records are dead, then unmap the data file.'''
+        with self._lock:
+            if self.dead > max(len(self.entries), 1000):
+                self.compact()
+            if self._mmap is not None:
+                self._mmap.close()
+                self._mmap = None
+
+
+def get_text_store():
+    '''Return the shared TextStore, or None if TEXT_STORE is disabled.'''
+    global _store
+    if not TEXT_STORE:
+        return None
+    with _store_lock:
+        if _store is None:
+            logger.info(f'Opening text store at {TEXT_STORE_PATH} (codec: {TEXT_STORE_CODEC})')
+            _store = TextStore(TEXT_STORE_PATH, TEXT_STORE_BLOCK_SIZE, TEXT_STORE_CODEC)
+    return _store
+
+
+def reset_text_store():
+    '''Close the shared TextStore so it is reopened on next use.'''
+    global _store
+    with _store_lock:
+        if _store is not None:
+            _store.close()
+            _store = None